@@ -0,0 +1,64 @@
+import sys
+import json
+import subprocess
+
+# Modules that must stay cheap to import, with their import-time budget in
+# milliseconds. None of them may load the heavy backends.
+BUDGETS = {
+    'deepqsnake': 50,
+    'deepqsnake.agent': 50,
+    'deepqsnake.environment': 50,
+    'deepqsnake.stats': 50,
+    'deepqsnake.stats.stats': 50,
+    'deepqsnake.agent.agent': 400,  # numpy only, the model is built lazily
+    'deepqsnake.agent.numpy_dqn': 400,  # numpy only
+    'deepqsnake.environment.environment': 400,  # pygame on first render
+    'deepqsnake.environment.snake': 50,
+    'deepqsnake.environment.food': 50,
+}
+HEAVY = ['tensorflow', 'keras', 'pygame', 'matplotlib', 'pylab']
+REPEATS = 3  # Best of REPEATS fresh interpreters
+
+PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter()-start)*1E3
+heavy = [m for m in {heavy} if m in sys.modules]
+print(json.dumps({{'ms': elapsed, 'heavy': heavy}}))
+'''
+
+
+def measure(module:str):
+    """Import the module in a fresh interpreter and measure the import time.
+
+    Parameters:
+        module (str): name of the module to import
+
+    Returns:
+        tuple: (best import time in ms, heavy backends loaded by the import)
+    """
+    best, heavy = float('inf'), []
+    for _ in range(REPEATS):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+            capture_output=True, text=True, check=True).stdout
+        res = json.loads(out.strip().splitlines()[-1])
+        best = min(best, res['ms'])
+        heavy = res['heavy']
+
+    return best, heavy
+
+
+failed = False
+for module, budget in BUDGETS.items():
+    ms, heavy = measure(module)
+    status = 'ok'
+    if ms > budget:
+        status = f'FAIL: over the {budget} ms budget'
+    if heavy:
+        status = f'FAIL: loads {", ".join(heavy)}'
+    failed |= status != 'ok'
+    print(f'{module:<36} {ms:>8.1f} ms   {status}')
+
+sys.exit(1 if failed else 0)
@@ -1 +1,19 @@
 #
+# The heavy backends (Keras/TensorFlow, pygame, matplotlib) are imported only
+# when the feature needing them is first used, so importing the package to
+# run the game engine or read the statistics stays cheap.
+import importlib
+
+_LAZY = {
+    'Agent': '.agent.agent',
+    'SnakeEnvironment': '.environment.environment',
+    'Statistics': '.stats.stats',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1 +1,23 @@
-from .agent import Agent
\ No newline at end of file
+import importlib
+
+_LAZY = {
+    'Agent': '.agent',
+    'DeepQNetwork': '.deep_q',
+    'ReplayMemory': '.replay_memory',
+    'DedupReplayMemory': '.dedup_memory',
+    'PolicyServer': '.policy_server',
+    'QuantizedPolicy': '.quantized',
+    'NumpyQNetwork': '.numpy_dqn',
+    'NumpyPolicy': '.numpy_policy',
+    'load_policy': '.numpy_policy',
+    'RayStateEncoder': '.ray_state',
+    'prefill_memory': '.prefill',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
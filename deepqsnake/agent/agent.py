@@ -1,7 +1,9 @@
 import math
+import random
 import numpy as np
 from .deep_q import DeepQNetwork
 from .replay_memory import ReplayMemory
+from .dedup_memory import DedupReplayMemory
 
 class Agent():
     """Deep Q-Learning agent. It gets the state from the game, assigns the rewards
@@ -14,33 +16,85 @@ class Agent():
         memory_batch_size (int): number of samples to retrieve from the memory
         eps_decay (float): The epsilon decay value for the Epsilon greedy strategy
         gamma (float): discounting factor for the Deep Q-Learning
+        state_encoder (RayStateEncoder): optional alternative state encoder.
+                                         If None the 11 features state is used
+        n_step (int): number of steps of the returns stored in the memory
+        prefetch_depth (int): number of batches sampled in background. 0 to
+                              sample them in the training loop
+        prefetch_staleness (int): maximum number of pushes performed since a
+                                  prefetched batch was sampled
+        learning_rate (float): learning rate of the DQN optimizer
+        action_mode (str): 'absolute' for the 4 directions (down, right, up,
+                           left) or 'relative' for the 3 turns (left,
+                           straight, right) from the snake POV
+        mask_actions (bool): exclude the invalid actions (reversing the
+                             direction) from exploration, exploitation and
+                             the target max
+        backend (str): 'keras' or 'numpy' implementation of the DQN
+        prefill_ratio (float): fraction of each training batch drawn from
+                               the transitions stored by prefill()
+        dedup_memory (bool): store each distinct experience once with its
+                             count, see DedupReplayMemory
 
     Attributes:
         screen_width (int): Width of the game screen in pixels.
         screen_height (int): Height of the game screen in pixels.
         memory (ReplayMemory): The memory used in the Deep Q-Learning 
         eps_decay (float): The epsilon decay value for the Epsilon greedy strategy
+        state_encoder (RayStateEncoder): alternative state encoder, if any
+        state_size (int): length of the state vector
+        action_mode (str): 'absolute' or 'relative' actions
+        n_actions (int): number of actions
+        default_action (int): the action keeping the current direction
 
     Methods:
         load_weights(w_path): Load the pre-trained weights
         get_state(snake, food):Get the current state of the game
         get_epsilon(current_step): Update the epsilon for the Epsilon greedy strategy
         set_reward(died, ate): Assigns the reward to the (state, action) pair
+        action_mask(states): Get the valid actions of a batch of states
+        random_action(state): Choose a random valid action
+        absolute_action(act, direction): Convert an action into a direction
     """
 
     def __init__(self, screen_width:int, screen_height:int, memory_capacity:int, 
-                 memory_batch_size:int, eps_decay:float, gamma:float):
+                 memory_batch_size:int, eps_decay:float, gamma:float,
+                 state_encoder=None, n_step:int=1, prefetch_depth:int=0,
+                 prefetch_staleness:int=None, learning_rate:float=1E-3,
+                 action_mode:str='absolute', mask_actions:bool=False,
+                 backend:str='keras', prefill_ratio:float=.25,
+                 dedup_memory:bool=False):
         
         # Set screen size
         self.screen_width=screen_width 
         self.screen_height=screen_height
+
+        # Set state encoder
+        self.state_encoder = state_encoder
+        self.state_size = 11 if state_encoder is None else state_encoder.size
+
+        # Set action space
+        if action_mode not in ('absolute', 'relative'):
+            raise ValueError(f'Unknown action mode: {action_mode}')
+        self.action_mode = action_mode
+        self.n_actions = 4 if action_mode == 'absolute' else 3
+        self.default_action = 0 if action_mode == 'absolute' else 1
+        self.mask_actions = mask_actions
         
         # Set memory
-        self.memory = ReplayMemory(
-            model=DeepQNetwork(), 
+        memory_cls = DedupReplayMemory if dedup_memory else ReplayMemory
+        self.memory = memory_cls(
+            model=DeepQNetwork(
+                state_size=self.state_size, learning_rate=learning_rate,
+                n_actions=self.n_actions, backend=backend), 
             capacity=memory_capacity, 
             batch_size=memory_batch_size,
-            gamma=gamma)
+            gamma=gamma,
+            n_step=n_step,
+            mask_fn=self.action_mask if mask_actions else None,
+            mix_ratio=prefill_ratio)
+        if prefetch_depth:
+            self.memory.start_prefetch(prefetch_depth, prefetch_staleness)
         self.eps_decay = eps_decay
 
     def load_weights(self, w_path:str):
@@ -69,6 +123,9 @@ class Agent():
         Returns:
             np.array: the current state vector
         """
+        if self.state_encoder is not None:
+            return self.state_encoder.encode(snake, food)
+
         state = np.zeros(11, dtype=int)
 
         # Snake goes down
@@ -202,3 +259,60 @@ class Agent():
             reward = -1
 
         return reward
+
+    def action_mask(self, states:np.array):
+        """Get the valid actions of a batch of states. In absolute mode the
+        action reversing the direction is invalid (the game ignores it). The
+        direction is read from the last 4 features (down, up, right, left)
+        of the state. In relative mode every action is valid.
+
+        Parameters:
+            states (np.array): state vectors, one row per game
+
+        Returns:
+            np.array: boolean mask of the valid actions, one row per state.
+                      None if every action is valid
+        """
+        if self.action_mode == 'relative':
+            return None
+        heading = np.reshape(states, (len(states), -1))[:, -4:] > .5
+        mask = np.ones((len(states), 4), dtype=bool)
+        # Going down forbids up (2), up forbids down (0), right forbids
+        # left (3) and left forbids right (1)
+        mask[:, [2, 0, 3, 1]] = ~heading
+
+        return mask
+
+    def random_action(self, state:np.array):
+        """Choose a random action for the exploration.
+
+        Parameters:
+            state (np.array): state vector representing the game status
+
+        Returns:
+            int: the action to perform
+        """
+        if not self.mask_actions:
+            return random.randint(0, self.n_actions-1)
+        mask = self.action_mask(np.reshape(state, (1, -1)))
+        if mask is None:
+            return random.randint(0, self.n_actions-1)
+
+        return random.choice(np.flatnonzero(mask[0]).tolist())
+
+    def absolute_action(self, act:int, direction:int):
+        """Convert an action into the absolute action understood by the game.
+        In relative mode 0 turns left, 1 keeps the direction and 2 turns
+        right, from the snake POV.
+
+        Parameters:
+            act (int): action chosen by the agent
+            direction (int): current direction of the snake
+
+        Returns:
+            int: the absolute action (0 down, 1 right, 2 up, 3 left)
+        """
+        if self.action_mode == 'absolute':
+            return act
+
+        return (direction + (1, 0, 3)[int(act)]) % 4
@@ -0,0 +1,82 @@
+import numpy as np
+from .deep_q import DeepQNetwork
+from .replay_memory import ReplayMemory
+
+class DedupReplayMemory(ReplayMemory):
+    """Replay memory storing each distinct experience once. The states of
+    the game are binary vectors and the rewards take a few values, so the
+    experiences repeat a lot: every experience is hashed into an index of
+    unique entries, each one a slot of the table with its occurrence count,
+    while the FIFO eviction is tracked by the ring of slot IDs. Sampling the
+    ring uniformly draws each entry proportionally to its count, i.e. as
+    uniform sampling over the raw stream of experiences.
+
+    Parameters:
+        model (agent.DeepQNetwork): DQN model
+        capacity (int): memory capacity
+        batch_size (int): number of samples to retrieve from the memory
+        gamma (float): discounting factor for the Deep Q-Learning
+        n_step (int): number of steps of the returns. Defaults to 1
+        mask_fn (callable): optional function mapping a batch of states to
+                            the boolean mask of their valid actions
+        mix_ratio (float): fraction of each batch drawn from the prefill
+                           store, when it is not empty
+
+    Attributes:
+        index (dict): slot ID of each distinct experience
+        counts (np.array): occurrences of each entry in the ring and in
+                           the prefill store
+        n_unique (int): number of distinct experiences
+    """
+
+    def __init__(self, model:DeepQNetwork, capacity:int, batch_size:int,
+                 gamma:float, n_step:int=1, mask_fn=None,
+                 mix_ratio:float=.25):
+        super().__init__(model, capacity, batch_size, gamma, n_step, mask_fn,
+                         mix_ratio)
+        self.index = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._keys = []
+
+    @property
+    def n_unique(self):
+        return len(self.index)
+
+    def _grow(self, state_size:int, rows:int):
+        super()._grow(state_size, rows)
+        counts = np.zeros(rows, dtype=np.int64)
+        counts[:len(self.counts)] = self.counts
+        self.counts = counts
+        self._keys += [None]*(rows-len(self._keys))
+
+    def _acquire(self, experience:tuple):
+        """Get the slot of an experience, storing it if new, and increase
+        its count.
+
+        Returns:
+            int: the slot ID
+        """
+        state, act, reward, nxt_state, done, discount = self._columns(
+            experience, self.gamma)
+        key = (state.tobytes(), act, reward, nxt_state.tobytes(), done,
+               discount)
+
+        slot = self.index.get(key)
+        if slot is None:
+            slot = super()._acquire(experience)
+            self.index[key] = slot
+            self._keys[slot] = key
+        self.counts[slot] += 1
+
+        return slot
+
+    def _release(self, slot:int):
+        """Decrease the count of an entry, freeing its slot when it is no
+        more referenced.
+
+        """
+        self.counts[slot] -= 1
+        if not self.counts[slot]:
+            del self.index[self._keys[slot]]
+            self._keys[slot] = None
+            super()._release(slot)
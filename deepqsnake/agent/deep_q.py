@@ -1,33 +1,63 @@
-from keras import Sequential
-from keras.optimizers import Adam # type: ignore
-from keras.layers import Dense, Dropout, Activation # type: ignore
-
 class DeepQNetwork():
     """ Neural Network used in Deep-Q-Learning
 
+    Parameters:
+        state_size (int): length of the state vector fed as input
+        learning_rate (float): learning rate of the Adam optimizer
+        n_actions (int): number of actions, i.e. of outputs
+        backend (str): 'keras' for the Keras model, 'numpy' for the
+                       NumpyQNetwork trained without TensorFlow
+
     Attributes:
-        model (keras.Sequential): neural network model
+        state_size (int): length of the state vector fed as input
+        learning_rate (float): learning rate of the Adam optimizer
+        n_actions (int): number of actions, i.e. of outputs
+        backend (str): 'keras' or 'numpy'
+        model (keras.Sequential or NumpyQNetwork): neural network model
 
     Methods:
-        create_model(): initialize and compile the keras model
+        create_model(): initialize and compile the model
     """
-    def __init__(self):
+    def __init__(self, state_size:int=11, learning_rate:float=1E-3,
+                 n_actions:int=4, backend:str='keras'):
+        if backend not in ('keras', 'numpy'):
+            raise ValueError(f'Unknown backend: {backend}')
+        self.state_size = state_size
+        self.learning_rate = learning_rate
+        self.n_actions = n_actions
+        self.backend = backend
         self.model = self.create_model()
 
     def create_model(self):
-        """Initialize and compile the keras model
+        """Initialize and compile the model. Keras (and TensorFlow) are
+        imported here, the first time a model is needed, and never with the
+        numpy backend.
 
         Returns:
-            keras.Sequential: the compiled model
+            keras.Sequential or NumpyQNetwork: the compiled model
         """
+        if self.backend == 'numpy':
+            from .numpy_dqn import NumpyQNetwork
+
+            model = NumpyQNetwork(
+                [self.state_size, 256, 128, 64, self.n_actions],
+                learning_rate=self.learning_rate)
+            model.summary()
+
+            return model
+
+        from keras import Sequential
+        from keras.optimizers import Adam # type: ignore
+        from keras.layers import Dense # type: ignore
+
         model = Sequential()
-        model.add(Dense(256, input_shape=(11,), activation='relu'))
+        model.add(Dense(256, input_shape=(self.state_size,), activation='relu'))
         model.add(Dense(128, activation='relu'))
         model.add(Dense(64, activation='relu'))
-        model.add(Dense(4))
+        model.add(Dense(self.n_actions))
 
         model.compile(loss='mse', optimizer=Adam(
-            learning_rate=1E-3), metrics=['accuracy'])
+            learning_rate=self.learning_rate), metrics=['accuracy'])
         
         model.summary()
 
@@ -0,0 +1,81 @@
+from collections import deque
+
+class NStepAccumulator():
+    """Rolling window folding the 1-step experiences of a game into discounted
+    n-step transitions as the game streams. Each emitted transition is
+    defined as (state, action, n-step return, state n steps later, done,
+    discount), where the discount gamma^k is the one to apply to the
+    bootstrapped Q-value of the last state.
+
+    Parameters:
+        n (int): number of steps of the returns
+        gamma (float): discounting factor for the Deep Q-Learning
+
+    Attributes:
+        n (int): number of steps of the returns
+        gamma (float): discounting factor for the Deep Q-Learning
+        window (deque): last (state, action, reward, next state) experiences
+
+    Methods:
+        push(experience, done): Add an experience and get the completed
+                                transitions
+        flush(done): Fold all the experiences left in the window
+    """
+
+    def __init__(self, n:int, gamma:float):
+        self.n = int(n)
+        self.gamma = gamma
+        self.window = deque()
+
+    def _fold(self, done:bool):
+        """Fold the window into the transition starting at its oldest
+        experience.
+
+        """
+        state, action = self.window[0][0], self.window[0][1]
+        ret = 0
+        for i, (_, _, reward, _) in enumerate(self.window):
+            ret += self.gamma**i * reward
+        nxt_state = self.window[-1][3]
+
+        return (state, action, ret, nxt_state, done,
+                self.gamma**len(self.window))
+
+    def push(self, experience:tuple, done:bool):
+        """Add an experience to the window and get the completed transitions.
+        When the game ends the whole window is flushed.
+
+        Parameters:
+            experience (tuple): game observation. It is defined as:
+                                (state, action, reward, next state)
+            done (bool): true if the snake died
+
+        Returns:
+            list: the completed n-step transitions
+        """
+        self.window.append(experience)
+        if done:
+            return self.flush(done)
+        if len(self.window) < self.n:
+            return []
+        transition = self._fold(False)
+        self.window.popleft()
+
+        return [transition]
+
+    def flush(self, done:bool):
+        """Fold all the experiences left in the window into transitions
+        shorter than n steps and empty the window.
+
+        Parameters:
+            done (bool): true if the last next state is terminal
+
+        Returns:
+            list: the folded transitions
+        """
+        transitions = []
+        while self.window:
+            transitions.append(self._fold(done))
+            self.window.popleft()
+
+        return transitions
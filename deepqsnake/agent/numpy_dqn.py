@@ -0,0 +1,317 @@
+import numpy as np
+from types import SimpleNamespace
+from .numpy_policy import read_weights, export_weights
+
+class NumpyQNetwork():
+    """Dense relu network trained with MSE and Adam entirely in NumPy. It
+    exposes the subset of the keras.Model interface used by the ReplayMemory
+    (predict, fit, get_weights, set_weights, load_weights, save_weights), so
+    it can replace the Keras model of the DQN. For such a small network the
+    per-call overhead of Keras is much larger than the arithmetic, while here
+    the activations, gradients and optimizer moments live in preallocated
+    float32 buffers reused by every call.
+
+    Parameters:
+        layer_sizes (list): input size followed by the units of each layer
+        learning_rate (float): learning rate of the Adam optimizer
+        beta_1 (float): decay of the first moment estimates
+        beta_2 (float): decay of the second moment estimates
+        epsilon (float): numerical stability constant of Adam
+        seed (int): seed of the weights initialization
+
+    Attributes:
+        layer_sizes (list): input size followed by the units of each layer
+        learning_rate (float): learning rate of the Adam optimizer
+        kernels (list): float32 kernels of the dense layers
+        biases (list): float32 biases of the dense layers
+        iterations (int): number of optimizer updates performed
+
+    Methods:
+        predict(x): Compute the outputs of a batch of inputs
+        fit(x, y, epochs, batch_size): Train the network on a dataset
+        get_weights(): Get the [kernel, bias, ...] arrays
+        set_weights(weights): Set the [kernel, bias, ...] arrays
+        load_weights(path): Load the weights from a .weights.h5 or .npz file
+        save_weights(path): Save the weights to a .weights.h5 or .npz file
+        summary(): Print the layers of the network
+    """
+
+    def __init__(self, layer_sizes:list, learning_rate:float=1E-3,
+                 beta_1:float=.9, beta_2:float=.999, epsilon:float=1E-7,
+                 seed:int=None):
+        self.layer_sizes = list(layer_sizes)
+        self.learning_rate = learning_rate
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+        self.iterations = 0
+
+        # Glorot uniform kernels and zero biases, as the Keras Dense layers
+        rng = np.random.default_rng(seed)
+        self.kernels = []
+        self.biases = []
+        for fan_in, fan_out in zip(self.layer_sizes, self.layer_sizes[1:]):
+            limit = np.sqrt(6/(fan_in+fan_out))
+            self.kernels.append(rng.uniform(
+                -limit, limit, (fan_in, fan_out)).astype(np.float32))
+            self.biases.append(np.zeros(fan_out, dtype=np.float32))
+        params = self.kernels + self.biases
+
+        # Adam moments and gradients, same shapes as the parameters
+        self._m = [np.zeros_like(p) for p in params]
+        self._v = [np.zeros_like(p) for p in params]
+        self._grads = [np.zeros_like(p) for p in params]
+        self._tmp = [np.zeros_like(p) for p in params]
+        # Activations and deltas, allocated once per batch size
+        self._buffers = {}
+
+    def _get_buffers(self, n:int):
+        """Get the activation and delta buffers for a batch of n rows.
+
+        """
+        buffers = self._buffers.get(n)
+        if buffers is None:
+            acts = [np.empty((n, size), dtype=np.float32)
+                    for size in self.layer_sizes]
+            deltas = [np.empty((n, size), dtype=np.float32)
+                      for size in self.layer_sizes[1:]]
+            buffers = self._buffers[n] = (acts, deltas)
+
+        return buffers
+
+    def _forward(self, x:np.array):
+        """Run the forward pass writing the activations in the buffers.
+
+        Returns:
+            list: the activations of each layer, input included
+        """
+        acts, _ = self._get_buffers(x.shape[0])
+        acts[0][...] = x
+        last = len(self.kernels) - 1
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            out = acts[i+1]
+            np.matmul(acts[i], kernel, out=out)
+            out += bias
+            # Hidden layers are relu activated
+            if i < last:
+                np.maximum(out, 0, out=out)
+
+        return acts
+
+    def _backward(self, acts:list, y:np.array):
+        """Backpropagate the MSE of the last forward pass into the gradient
+        buffers.
+
+        Returns:
+            tuple: (loss, accuracy) of the forward pass
+        """
+        n_layers = len(self.kernels)
+        _, deltas = self._get_buffers(y.shape[0])
+        pred = acts[-1]
+        delta = deltas[-1]
+        np.subtract(pred, y, out=delta)
+        loss = float(np.mean(np.square(delta)))
+        # Keras resolves 'accuracy' for this loss as categorical accuracy
+        accuracy = float(np.mean(np.argmax(pred, 1) == np.argmax(y, 1)))
+        # Gradient of the mean over rows and outputs
+        delta *= 2/delta.size
+
+        for i in reversed(range(n_layers)):
+            delta = deltas[i]
+            np.matmul(acts[i].T, delta, out=self._grads[i])
+            np.sum(delta, axis=0, out=self._grads[n_layers+i])
+            if i > 0:
+                prev = deltas[i-1]
+                np.matmul(delta, self.kernels[i].T, out=prev)
+                # Relu derivative
+                prev *= acts[i] > 0
+
+        return loss, accuracy
+
+    def _apply_gradients(self):
+        """Update the parameters with Adam, as the Keras optimizer does.
+
+        """
+        self.iterations += 1
+        t = self.iterations
+        lr = self.learning_rate*np.sqrt(1-self.beta_2**t)/(1-self.beta_1**t)
+        params = self.kernels + self.biases
+        for p, g, m, v, tmp in zip(
+                params, self._grads, self._m, self._v, self._tmp):
+            # m += (g - m)*(1 - beta_1)
+            np.subtract(g, m, out=tmp)
+            tmp *= 1-self.beta_1
+            m += tmp
+            # v += (g^2 - v)*(1 - beta_2)
+            np.square(g, out=tmp)
+            tmp -= v
+            tmp *= 1-self.beta_2
+            v += tmp
+            # p -= lr*m/(sqrt(v) + epsilon)
+            np.sqrt(v, out=tmp)
+            tmp += self.epsilon
+            np.divide(m, tmp, out=tmp)
+            tmp *= lr
+            p -= tmp
+
+    def predict(self, x:np.array, verbose=0, batch_size:int=None):
+        """Compute the outputs of a batch of inputs.
+
+        Parameters:
+            x (np.array): inputs, one row per sample
+            verbose: ignored, kept for compatibility with keras
+
+        Returns:
+            np.array: the outputs, one row per sample
+        """
+        x = np.reshape(np.asarray(x, dtype=np.float32),
+                       (-1, self.layer_sizes[0]))
+
+        return self._forward(x)[-1].copy()
+
+    def fit(self, x:np.array, y:np.array, epochs:int=1, verbose=0,
+            batch_size:int=None, shuffle:bool=True):
+        """Train the network minimizing the MSE between outputs and targets.
+
+        Parameters:
+            x (np.array): inputs, one row per sample
+            y (np.array): targets, one row per sample
+            epochs (int): number of passes over the dataset
+            verbose: ignored, kept for compatibility with keras
+            batch_size (int): samples per update, 32 by default as in keras
+            shuffle (bool): shuffle the samples before each epoch
+
+        Returns:
+            SimpleNamespace: object with a keras-like history dict of the
+                             mean loss and accuracy of each epoch
+        """
+        x = np.reshape(np.asarray(x, dtype=np.float32),
+                       (-1, self.layer_sizes[0]))
+        y = np.reshape(np.asarray(y, dtype=np.float32),
+                       (-1, self.layer_sizes[-1]))
+        n = x.shape[0]
+        batch_size = min(batch_size or 32, n)
+
+        history = {'loss': [], 'accuracy': []}
+        for _ in range(epochs):
+            if shuffle and batch_size < n:
+                order = np.random.permutation(n)
+                x, y = x[order], y[order]
+            losses, accuracies, weights = [], [], []
+            for start in range(0, n, batch_size):
+                xb = x[start:start+batch_size]
+                yb = y[start:start+batch_size]
+                acts = self._forward(xb)
+                loss, accuracy = self._backward(acts, yb)
+                self._apply_gradients()
+                losses.append(loss)
+                accuracies.append(accuracy)
+                weights.append(xb.shape[0])
+            history['loss'].append(float(np.average(losses, weights=weights)))
+            history['accuracy'].append(
+                float(np.average(accuracies, weights=weights)))
+
+        return SimpleNamespace(history=history)
+
+    def get_weights(self):
+        """Get the weights of the network.
+
+        Returns:
+            list: [kernel, bias, kernel, bias, ...] arrays in layer order
+        """
+        return [w.copy() for pair in zip(self.kernels, self.biases)
+                for w in pair]
+
+    def set_weights(self, weights:list):
+        """Set the weights of the network.
+
+        Parameters:
+            weights (list): [kernel, bias, kernel, bias, ...] arrays in layer
+                            order, as returned by keras.Model.get_weights()
+        """
+        if len(weights) != 2*len(self.kernels):
+            raise ValueError(f'Expected {2*len(self.kernels)} arrays, '
+                             f'got {len(weights)}')
+        for i, (kernel, bias) in enumerate(zip(weights[::2], weights[1::2])):
+            if np.shape(kernel) != self.kernels[i].shape \
+                    or np.shape(bias) != self.biases[i].shape:
+                raise ValueError(f'Weights of layer {i} do not match the '
+                                 'network shape')
+            self.kernels[i][...] = kernel
+            self.biases[i][...] = bias
+
+    def load_weights(self, path:str):
+        """Load the weights from a .weights.h5 file written by Keras or by
+        save_weights(), or from a flat .npz file. The Adam state stored in
+        the .weights.h5 files is restored as well.
+
+        Parameters:
+            path (str): path of the saved weights
+        """
+        self.set_weights(read_weights(path))
+        if path.endswith('.npz'):
+            return
+
+        import h5py
+        with h5py.File(path, 'r') as f:
+            if 'optimizer/vars' not in f:
+                return
+            opt = f['optimizer/vars']
+            n_params = len(self._m)
+            if len(opt) != 2 + 2*n_params:
+                return
+            # Keras orders the moments as m, v of each variable, and the
+            # variables as kernel, bias of each layer
+            n_layers = len(self.kernels)
+            order = [j for i in range(n_layers) for j in (i, n_layers+i)]
+            self.iterations = int(opt['0'][()])
+            for k, j in enumerate(order):
+                self._m[j][...] = opt[str(2+2*k)][()]
+                self._v[j][...] = opt[str(3+2*k)][()]
+
+    def save_weights(self, path:str):
+        """Save the weights. The .weights.h5 files follow the layout written
+        by keras.Model.save_weights(), so they can be loaded by the Keras
+        model, while .npz paths get a flat export.
+
+        Parameters:
+            path (str): path of the .weights.h5 or .npz file
+        """
+        if path.endswith('.npz'):
+            export_weights(self.get_weights(), path)
+            return
+
+        import h5py
+        n_layers = len(self.kernels)
+        with h5py.File(path, 'w') as f:
+            layers = f.create_group('layers')
+            for i, (kernel, bias) in enumerate(
+                    zip(self.kernels, self.biases)):
+                name = 'dense' if i == 0 else f'dense_{i}'
+                group = layers.create_group(name).create_group('vars')
+                group.attrs['name'] = name
+                group.create_dataset('0', data=kernel)
+                group.create_dataset('1', data=bias)
+            opt = f.create_group('optimizer').create_group('vars')
+            opt.attrs['name'] = 'adam'
+            opt.create_dataset('0', data=np.int64(self.iterations))
+            opt.create_dataset('1', data=np.float32(self.learning_rate))
+            order = [j for i in range(n_layers) for j in (i, n_layers+i)]
+            for k, j in enumerate(order):
+                opt.create_dataset(str(2+2*k), data=self._m[j])
+                opt.create_dataset(str(3+2*k), data=self._v[j])
+            f.create_group('vars').attrs['name'] = 'sequential'
+
+    def summary(self):
+        """Print the layers of the network.
+
+        """
+        total = 0
+        print('NumpyQNetwork')
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            params = kernel.size + bias.size
+            total += params
+            activation = 'relu' if i < len(self.kernels)-1 else 'linear'
+            print(f'  dense_{i}: {kernel.shape[0]} -> {kernel.shape[1]} '
+                  f'({activation}), {params} params')
+        print(f'Total params: {total}')
@@ -0,0 +1,194 @@
+import re
+import numpy as np
+
+class NumpyPolicy():
+    """Greedy DQN policy running the forward pass of the dense network in
+    NumPy. It is built straight from the saved weights, so neither Keras nor
+    TensorFlow are imported and the first move is available as soon as the
+    weights are read.
+
+    Parameters:
+        weights (list): [kernel, bias, kernel, bias, ...] float arrays
+
+    Attributes:
+        kernels (list): float32 kernels of the dense layers
+        biases (list): float32 biases of the dense layers
+        nbytes (int): memory held by the parameters in bytes
+
+    Methods:
+        load(path): Build the policy from a .weights.h5 or a .npz file
+        predict(states): Compute the Q-values of a batch of states
+        exploit(state): Choose the best action for a single state
+        exploit_batch(states): Choose the best actions for a batch of states
+    """
+
+    def __init__(self, weights:list):
+        self.kernels = [np.asarray(w, dtype=np.float32) for w in weights[::2]]
+        self.biases = [np.asarray(w, dtype=np.float32) for w in weights[1::2]]
+
+    @classmethod
+    def load(cls, path:str):
+        """Build the policy from a .weights.h5 or a .npz file.
+
+        Parameters:
+            path (str): path of the saved weights
+
+        Returns:
+            NumpyPolicy: the loaded policy
+        """
+        return cls(read_weights(path))
+
+    def predict(self, states:np.array):
+        """Compute the Q-values of a batch of states.
+
+        Parameters:
+            states (np.array): state vectors, one row per game
+
+        Returns:
+            np.array: the Q-values of each (state, action) pair
+        """
+        x = np.asarray(states, dtype=np.float32)
+        x = np.reshape(x, (-1, self.kernels[0].shape[0]))
+        last = len(self.kernels) - 1
+        for i, bias in enumerate(self.biases):
+            x = self._dense(x, i)
+            x += bias
+            # Hidden layers are relu activated
+            if i < last:
+                np.maximum(x, 0, out=x)
+
+        return x
+
+    def _dense(self, x:np.array, i:int):
+        """Multiply the activations by the kernel of the i-th layer.
+
+        """
+        return x @ self.kernels[i]
+
+    @property
+    def nbytes(self):
+        return sum(k.nbytes for k in self.kernels) \
+            + sum(b.nbytes for b in self.biases)
+
+    def __call__(self, state:np.array):
+        return self.exploit(state)
+
+    def exploit(self, state:np.array):
+        """Choose the best action for a single state.
+
+        Parameters:
+            state (np.array): state vector representing the game status
+
+        Returns:
+            int: the action to perform
+        """
+        return int(np.argmax(self.predict(state)[0]))
+
+    def exploit_batch(self, states:np.array):
+        """Choose the best action for a batch of states.
+
+        Parameters:
+            states (np.array): state vectors, one row per game
+
+        Returns:
+            np.array: the actions to perform
+        """
+        return np.argmax(self.predict(states), axis=1)
+
+
+def _natural_key(path:str):
+    """Sort key ordering Keras layer paths by creation index, so that
+    dense, dense_1, ..., dense_10 keep the order of the network.
+
+    """
+    key = []
+    for name in path.split('/'):
+        match = re.fullmatch(r'(.*?)(?:_(\d+))?', name)
+        key.append((match.group(1), int(match.group(2) or 0)))
+
+    return key
+
+
+def _is_quantized(path:str):
+    """Check whether a .npz file was written by QuantizedPolicy.save().
+
+    """
+    with np.load(path) as data:
+        return 'n_layers' in data.files
+
+
+def read_weights(path:str):
+    """Read the weights of the DQN into NumPy arrays, without importing Keras
+    or TensorFlow. Both the .weights.h5 files written by
+    keras.Model.save_weights() and the flat .npz files written by
+    export_weights() are supported, as well as the quantized .npz files
+    written by QuantizedPolicy.save(), which are dequantized.
+
+    Parameters:
+        path (str): path of the saved weights
+
+    Returns:
+        list: [kernel, bias, kernel, bias, ...] arrays in layer order
+    """
+    if path.endswith('.npz'):
+        if _is_quantized(path):
+            from .quantized import QuantizedPolicy
+            policy = QuantizedPolicy.load(path)
+            return policy.dequantize()
+        with np.load(path) as data:
+            return [data[f'arr_{i}'] for i in range(len(data.files))]
+
+    import h5py
+    layers = []
+    with h5py.File(path, 'r') as f:
+        def collect(name, obj):
+            # Each layer stores its variables as datasets '0', '1', ...
+            # inside a 'vars' group
+            if isinstance(obj, h5py.Group) and name.endswith('vars') \
+                    and len(obj):
+                layers.append(
+                    (name, [obj[str(i)][()] for i in range(len(obj))]))
+        f['layers'].visititems(collect)
+    layers.sort(key=lambda layer: _natural_key(layer[0]))
+
+    return [w for _, layer in layers for w in layer]
+
+
+def export_weights(weights:list, path:str):
+    """Export the weights of the DQN to a flat .npz file, one array per
+    kernel or bias in layer order.
+
+    Parameters:
+        weights (list): [kernel, bias, kernel, bias, ...] arrays, as
+                        returned by keras.Model.get_weights()
+        path (str): path of the .npz file
+    """
+    np.savez(path, *[np.asarray(w, dtype=np.float32) for w in weights])
+
+
+def load_policy(path:str, mode:str=None):
+    """Load a callable greedy policy from saved weights without importing
+    Keras or TensorFlow.
+
+    Parameters:
+        path (str): path of a .weights.h5, a flat .npz or a quantized .npz
+                    file
+        mode (str): optional quantization mode, 'int8' or 'float16'. The
+                    quantized files are loaded in their own mode
+
+    Returns:
+        NumpyPolicy or QuantizedPolicy: the loaded policy
+    """
+    from .quantized import QuantizedPolicy
+    if path.endswith('.npz') and _is_quantized(path):
+        policy = QuantizedPolicy.load(path)
+        if mode is not None and mode != policy.mode:
+            raise ValueError(f'{path} is quantized in {policy.mode} mode, '
+                             f'not {mode}')
+        return policy
+
+    weights = read_weights(path)
+    if mode is None:
+        return NumpyPolicy(weights)
+
+    return QuantizedPolicy.from_weights(weights, mode)
@@ -0,0 +1,196 @@
+import time
+import random
+import asyncio
+import numpy as np
+from .replay_memory import ReplayMemory
+
+class PolicyServer():
+    """Asyncio inference server shared by many concurrent games. Each game
+    awaits act(state) once per tick. The requests are queued and merged into
+    micro-batches: a batch is dispatched as soon as it is full or when the
+    oldest request has waited for the latency budget. Every micro-batch costs
+    a single forward pass of the network. A request with a state of the
+    wrong size fails on its own, without affecting the rest of the batch.
+
+    Parameters:
+        memory (ReplayMemory): replay memory holding the trained DQN
+        max_batch_size (int): maximum number of requests in a micro-batch
+        max_latency (float): latency budget in seconds before a partial
+                             micro-batch is dispatched
+        state_size (int): length of the state vectors. Defaults to 11
+
+    Attributes:
+        memory (ReplayMemory): replay memory holding the trained DQN
+        max_batch_size (int): maximum number of requests in a micro-batch
+        max_latency (float): latency budget in seconds
+        state_size (int): length of the state vectors
+        queue (asyncio.Queue): pending (state, future) requests
+        batch_ctr (int): number of forward passes performed
+        request_ctr (int): number of requests served
+
+    Methods:
+        start(): Start the batching loop on the running event loop
+        stop(): Stop the batching loop and fail the pending requests
+        act(state): Queue a state and wait for the best action
+    """
+
+    def __init__(self, memory:ReplayMemory, max_batch_size:int=64,
+                 max_latency:float=2E-3, state_size:int=11):
+        self.memory = memory
+        self.max_batch_size = int(max_batch_size)
+        self.max_latency = max_latency
+        self.state_size = int(state_size)
+        self.queue = None
+        self.batch_ctr = 0
+        self.request_ctr = 0
+        self._task = None
+        # Requests taken from the queue and not answered yet
+        self._inflight = []
+
+    async def start(self):
+        """Start the batching loop on the running event loop.
+
+        """
+        self.queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._serve())
+
+    async def stop(self):
+        """Stop the batching loop and fail the requests still pending, both
+        the ones in the queue and the ones of the micro-batch being served.
+
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = self._inflight
+        self._inflight = []
+        while self.queue is not None and not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError('Policy server stopped'))
+
+    async def act(self, state:np.array):
+        """Queue a state and wait for the action chosen by the DQN.
+
+        Parameters:
+            state (np.array): state vector representing the game status
+
+        Returns:
+            int: the action to perform predicted by the DQN
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((state, future))
+
+        return await future
+
+    async def _collect(self, batch:list):
+        """Wait for the first request, then keep collecting requests until the
+        micro-batch is full or the latency budget of the first one expires.
+        The requests already queued are taken without suspending, the loop
+        only waits when the queue is empty.
+
+        Parameters:
+            batch (list): list receiving the (state, future) requests of the
+                          micro-batch
+        """
+        loop = asyncio.get_running_loop()
+        batch.append(await self.queue.get())
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _serve(self):
+        """Batching loop. The forward pass runs in the default executor so
+        the event loop keeps queueing requests for the next micro-batch.
+
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            # Kept on the server, so stop() fails the requests of a batch
+            # cancelled while being collected or served
+            self._inflight = batch = []
+            await self._collect(batch)
+            valid = []
+            for state, future in batch:
+                if np.size(state) == self.state_size:
+                    valid.append((state, future))
+                elif not future.done():
+                    future.set_exception(ValueError(
+                        f'Expected a state of size {self.state_size}, got '
+                        f'{np.size(state)}'))
+            if not valid:
+                continue
+            try:
+                states = np.stack([np.ravel(state) for state, _ in valid])
+                actions = await loop.run_in_executor(
+                    None, self.memory.exploit_batch, states)
+            except Exception as err:
+                for _, future in valid:
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+            self.batch_ctr += 1
+            self.request_ctr += len(valid)
+            for (_, future), action in zip(valid, actions):
+                # The caller may have been cancelled meanwhile
+                if not future.done():
+                    future.set_result(int(action))
+
+
+async def load_test(server:PolicyServer, n_games:int, n_ticks:int):
+    """Built-in load generator. Simulate n_games concurrent games, each one
+    requesting an action per tick for n_ticks ticks with a random binary
+    state, and measure the latency of every request.
+
+    Parameters:
+        server (PolicyServer): a started policy server
+        n_games (int): number of concurrent games
+        n_ticks (int): number of actions requested by each game
+
+    Returns:
+        dict: throughput (requests/s), p50 and p99 latencies (ms) and the
+              average micro-batch size
+    """
+    latencies = []
+    batch_start = server.batch_ctr
+    request_start = server.request_ctr
+
+    async def game():
+        for _ in range(n_ticks):
+            state = np.array(
+                [random.randint(0, 1) for _ in range(server.state_size)])
+            start = time.perf_counter()
+            await server.act(state)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[game() for _ in range(n_games)])
+    elapsed = time.perf_counter() - start
+
+    latencies = np.asarray(latencies)*1E3
+    batches = max(server.batch_ctr - batch_start, 1)
+
+    return {
+        'games': n_games,
+        'throughput': len(latencies)/elapsed,
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99)),
+        'avg_batch': (server.request_ctr - request_start)/batches
+    }
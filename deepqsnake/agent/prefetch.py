@@ -0,0 +1,100 @@
+import time
+import queue
+import threading
+
+class BatchPrefetcher():
+    """Background thread sampling batches from the replay memory and
+    stacking them into training arrays, so that batch assembly overlaps with
+    the forward and backward passes of the learner. The ready batches are
+    kept in a bounded queue. A batch sampled more than max_staleness pushes
+    ago is discarded by the learner.
+
+    Parameters:
+        memory (ReplayMemory): the replay memory to sample from
+        depth (int): maximum number of ready batches in the queue
+        max_staleness (int): maximum number of pushes performed since a
+                             batch was sampled. None to disable the check
+
+    Attributes:
+        memory (ReplayMemory): the replay memory to sample from
+        depth (int): maximum number of ready batches in the queue
+        max_staleness (int): maximum staleness in pushes of a batch
+        queue (queue.Queue): ready (push count, batch arrays) pairs
+        hits (int): batches served from the queue
+        misses (int): requests found the queue empty
+        stale (int): batches discarded for being too old
+
+    Methods:
+        start(): Start the sampling thread
+        stop(): Stop the sampling thread
+        get(): Get a fresh ready batch without waiting
+    """
+
+    def __init__(self, memory, depth:int=4, max_staleness:int=None):
+        self.memory = memory
+        self.depth = int(depth)
+        self.max_staleness = max_staleness
+        self.queue = queue.Queue(maxsize=self.depth)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the sampling thread.
+
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sampling thread and drop the ready batches.
+
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    def _run(self):
+        """Sampling loop. Batches are only prefetched once the memory holds a
+        full batch, before that the learner trains on the whole memory.
+
+        """
+        while not self._stop.is_set():
+            if len(self.memory) < self.memory.batch_size:
+                time.sleep(1E-3)
+                continue
+            push_count = self.memory.push_count
+            batch = self.memory.sample_batch(False)
+            while not self._stop.is_set():
+                try:
+                    self.queue.put((push_count, batch), timeout=.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def get(self):
+        """Get a ready batch without waiting, skipping the stale ones.
+
+        Returns:
+            tuple: the batch arrays as returned by ReplayMemory.build_batch,
+                   None if no fresh batch is ready
+        """
+        while True:
+            try:
+                push_count, batch = self.queue.get_nowait()
+            except queue.Empty:
+                self.misses += 1
+                return None
+            if self.max_staleness is not None \
+                    and self.memory.push_count-push_count > self.max_staleness:
+                self.stale += 1
+                continue
+            self.hits += 1
+
+            return batch
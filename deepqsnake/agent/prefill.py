@@ -0,0 +1,165 @@
+import random
+from collections import deque
+from .n_step import NStepAccumulator
+
+CELL = 20  # Size of a board cell in pixels
+# Head displacement of each direction (0 down, 1 right, 2 up, 3 left)
+MOVES = ((0, CELL), (CELL, 0), (0, -CELL), (-CELL, 0))
+
+
+def _free(x:int, y:int, width:int, height:int, body:set):
+    """Check that the head can enter the (x, y) cell.
+
+    """
+    return 10 <= x <= width-40 and 10 <= y <= height-40 \
+        and (x, y) not in body
+
+
+def _area(start:tuple, width:int, height:int, body:set, limit:int):
+    """Count the free cells reachable from start, up to limit.
+
+    """
+    seen = {start}
+    queue = deque([start])
+    while queue and len(seen) < limit:
+        x, y = queue.popleft()
+        for dx, dy in MOVES:
+            cell = (x+dx, y+dy)
+            if cell not in seen and _free(*cell, width, height, body):
+                seen.add(cell)
+                queue.append(cell)
+
+    return len(seen)
+
+
+def heuristic_direction(snake, food, width:int, height:int):
+    """Choose the direction of the shortest safe path to the food, found with
+    a breadth-first search over the board cells. When the food cannot be
+    reached the snake moves towards the largest free area.
+
+    Parameters:
+        snake (Snake): the snake object
+        food (Food): the food object
+        width (int): width of the game screen in pixels
+        height (int): height of the game screen in pixels
+
+    Returns:
+        int: the absolute direction (0 down, 1 right, 2 up, 3 left)
+    """
+    head = (snake.x[0], snake.y[0])
+    # The tail moves away during the step
+    body = set(zip(snake.x[1:snake.len-1], snake.y[1:snake.len-1]))
+    # Reversing the direction is not allowed
+    back = (snake.dir+2) % 4
+
+    # Breadth-first search, remembering the first move of each path
+    first = {}
+    queue = deque()
+    for d, (dx, dy) in enumerate(MOVES):
+        cell = (head[0]+dx, head[1]+dy)
+        if d != back and _free(*cell, width, height, body):
+            first[cell] = d
+            queue.append(cell)
+    while queue:
+        cell = queue.popleft()
+        if cell == food.pos:
+            return first[cell]
+        for dx, dy in MOVES:
+            nxt = (cell[0]+dx, cell[1]+dy)
+            if nxt not in first and nxt != head \
+                    and _free(*nxt, width, height, body):
+                first[nxt] = first[cell]
+                queue.append(nxt)
+
+    # Food unreachable: survive as long as possible
+    limit = snake.len*4
+    best, best_area = snake.dir, -1
+    for d, (dx, dy) in enumerate(MOVES):
+        cell = (head[0]+dx, head[1]+dy)
+        if d != back and _free(*cell, width, height, body):
+            area = _area(cell, width, height, body, limit)
+            if area > best_area:
+                best, best_area = d, area
+
+    return best
+
+
+def heuristic_action(agent, snake, food):
+    """Convert the heuristic direction into an action of the agent's action
+    space.
+
+    Parameters:
+        agent (Agent): the agent
+        snake (Snake): the snake object
+        food (Food): the food object
+
+    Returns:
+        int: the action to perform
+    """
+    direction = heuristic_direction(
+        snake, food, agent.screen_width, agent.screen_height)
+    if agent.action_mode == 'absolute':
+        return direction
+
+    # Turns wrt the current direction: straight, left, -, right
+    return (1, 0, 1, 2)[(direction-snake.dir) % 4]
+
+
+def prefill_memory(agent, n_transitions:int, eps:float=.1,
+                   max_steps_since_food:float=2):
+    """Play headless games with the heuristic policy and push the resulting
+    transitions in bulk into the prefill store of the agent's memory, before
+    training starts. A fraction eps of random actions adds the mistakes the
+    heuristic never makes. The transitions carry their own done flag and
+    discount, folded over the n steps of the memory.
+
+    Parameters:
+        agent (Agent): agent providing the states, rewards and memory
+        n_transitions (int): number of transitions to generate
+        eps (float): probability of a random action
+        max_steps_since_food (float): steps without food ending a game, as a
+                                      multiple of the board cells
+
+    Returns:
+        dict: number of transitions, games and mean score
+    """
+    from ..stats.stats import Statistics
+    from ..environment.environment import SnakeEnvironment
+
+    memory = agent.memory
+    n_step = NStepAccumulator(memory.n_step, memory.gamma)
+    transitions = []
+    games = 0
+    scores = 0
+    while len(transitions) < n_transitions:
+        env = SnakeEnvironment(
+            screen_width=agent.screen_width,
+            screen_height=agent.screen_height,
+            stat=Statistics(),
+            episode=games,
+            agent=agent,
+            train=False,
+            display=False,
+            max_steps_since_food=max_steps_since_food,
+            fps=None
+        )
+        while not env.stop:
+            env.step_ctr += 1
+            state1 = agent.get_state(env.snake, env.food)
+            if random.random() < eps:
+                action = agent.random_action(state1)
+            else:
+                action = heuristic_action(agent, env.snake, env.food)
+            env.step(action, state1)
+            state2 = agent.get_state(env.snake, env.food)
+            experience = (state1, action, env.reward, state2)
+            transitions += n_step.push(experience, env.died)
+        # Truncated games are bootstrapped
+        transitions += n_step.flush(env.died)
+        games += 1
+        scores += env.score
+    transitions = transitions[:n_transitions]
+    memory.prefill(transitions)
+
+    return {'transitions': len(transitions), 'games': games,
+            'score': scores/games}
@@ -0,0 +1,175 @@
+import itertools
+import numpy as np
+from .numpy_policy import NumpyPolicy
+
+class QuantizedPolicy(NumpyPolicy):
+    """Greedy DQN policy running on quantized weights. The kernels of the
+    dense layers are stored either as int8 with one symmetric scale per layer
+    or as float16. The biases are kept in float32. Only the quantized arrays
+    are held by the policy: each layer casts its kernel to a float32
+    temporary for the matmul, released right after, and applies the scale to
+    the output. The forward pass runs in NumPy, so no deep learning framework
+    is needed at inference time, and the rest of it and the action selection
+    are the ones of NumpyPolicy.
+
+    Parameters:
+        kernels (list): kernels of the dense layers (int8 or float16)
+        biases (list): biases of the dense layers (float32)
+        scales (list): per-layer dequantization scales (1.0 for float16)
+        mode (str): quantization mode, either 'int8' or 'float16'
+
+    Attributes:
+        kernels (list): kernels of the dense layers
+        biases (list): biases of the dense layers
+        scales (list): per-layer dequantization scales
+        mode (str): quantization mode
+        nbytes (int): memory held by the parameters and scales in bytes
+
+    Methods:
+        from_weights(weights, mode): Quantize a list of [kernel, bias] arrays
+        from_model(model, mode): Quantize the weights of a trained model
+        load(path): Load a policy exported with save()
+        save(path): Export the quantized arrays to a .npz file
+        dequantize(): Get the float32 [kernel, bias, ...] arrays
+    """
+
+    MODES = ('int8', 'float16')
+
+    def __init__(self, kernels:list, biases:list, scales:list, mode:str):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown quantization mode: {mode}')
+        self.kernels = kernels
+        self.biases = biases
+        self.scales = [np.float32(s) for s in scales]
+        self.mode = mode
+
+    @classmethod
+    def from_weights(cls, weights:list, mode:str='int8'):
+        """Quantize a flat list of [kernel, bias, kernel, bias, ...] arrays,
+        as returned by keras.Model.get_weights().
+
+        Parameters:
+            weights (list): float32 weights of the dense layers
+            mode (str): quantization mode, either 'int8' or 'float16'
+
+        Returns:
+            QuantizedPolicy: the quantized policy
+        """
+        kernels, biases, scales = [], [], []
+        for kernel, bias in zip(weights[::2], weights[1::2]):
+            kernel = np.asarray(kernel, dtype=np.float32)
+            if mode == 'int8':
+                # Symmetric quantization: the largest weight maps to 127
+                scale = float(np.max(np.abs(kernel)))/127 or 1.0
+                kernel = np.clip(np.round(kernel/scale), -127, 127)
+                kernels.append(kernel.astype(np.int8))
+            else:
+                scale = 1.0
+                kernels.append(kernel.astype(np.float16))
+            biases.append(np.asarray(bias, dtype=np.float32))
+            scales.append(scale)
+
+        return cls(kernels, biases, scales, mode)
+
+    @classmethod
+    def from_model(cls, model, mode:str='int8'):
+        """Quantize the weights of a trained model.
+
+        Parameters:
+            model (keras.Sequential): the trained DQN
+            mode (str): quantization mode, either 'int8' or 'float16'
+
+        Returns:
+            QuantizedPolicy: the quantized policy
+        """
+        return cls.from_weights(model.get_weights(), mode)
+
+    @classmethod
+    def load(cls, path:str):
+        """Load a policy exported with save().
+
+        Parameters:
+            path (str): path of the .npz file
+
+        Returns:
+            QuantizedPolicy: the quantized policy
+        """
+        with np.load(path) as data:
+            n_layers = int(data['n_layers'])
+            kernels = [data[f'kernel_{i}'] for i in range(n_layers)]
+            biases = [data[f'bias_{i}'] for i in range(n_layers)]
+            scales = list(data['scales'])
+            mode = str(data['mode'])
+
+        return cls(kernels, biases, scales, mode)
+
+    def save(self, path:str):
+        """Export the quantized arrays to a .npz file.
+
+        Parameters:
+            path (str): path of the .npz file
+        """
+        arrays = {}
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            arrays[f'kernel_{i}'] = kernel
+            arrays[f'bias_{i}'] = bias
+        np.savez(
+            path, n_layers=len(self.kernels), mode=self.mode,
+            scales=np.asarray(self.scales, dtype=np.float32), **arrays)
+
+    def dequantize(self):
+        """Get the float32 weights represented by the quantized arrays.
+
+        Returns:
+            list: [kernel, bias, kernel, bias, ...] arrays in layer order
+        """
+        return [w for k, b, s in zip(self.kernels, self.biases, self.scales)
+                for w in (k.astype(np.float32)*s, b)]
+
+    def _dense(self, x:np.array, i:int):
+        """Multiply the activations by the quantized kernel of the i-th
+        layer, rescaling the output.
+
+        """
+        x = x @ self.kernels[i].astype(np.float32)
+        if self.mode == 'int8':
+            x *= self.scales[i]
+
+        return x
+
+    @property
+    def nbytes(self):
+        return super().nbytes + sum(s.nbytes for s in self.scales)
+
+
+def all_states(size:int=11):
+    """Enumerate every binary state vector.
+
+    Parameters:
+        size (int): length of the state vector
+
+    Returns:
+        np.array: the 2^size state vectors, one per row
+    """
+    return np.array(list(itertools.product((0, 1), repeat=size)))
+
+
+def action_agreement(model, policy:QuantizedPolicy, states:np.array=None):
+    """Measure the fraction of states in which the quantized policy chooses
+    the same action as the full precision model. By default the whole binary
+    state space is evaluated.
+
+    Parameters:
+        model (keras.Sequential): the full precision DQN
+        policy (QuantizedPolicy): the quantized policy
+        states (np.array): states to evaluate. Defaults to all the states
+
+    Returns:
+        float: the action agreement in [0, 1]
+    """
+    if states is None:
+        states = all_states()
+    reference = np.argmax(model.predict(states, verbose=0), axis=1)
+    quantized = policy.exploit_batch(states)
+
+    return float(np.mean(reference == quantized))
@@ -0,0 +1,279 @@
+import weakref
+import numpy as np
+from collections import deque
+
+# Grid size of the game in pixels
+CELL = 20
+
+# Unit vectors of the snake directions: 0 down, 1 right, 2 up, 3 left
+DIRS = np.array([(0, 1), (1, 0), (0, -1), (-1, 0)])
+
+
+class BodyOccupancy():
+    """Occupancy grid of the snake body, updated incrementally after each
+    move: the new head cell is added and the tail cell is released, so the
+    update cost does not depend on the snake length.
+
+    Parameters:
+        n_cols (int): number of grid columns of the board
+        n_rows (int): number of grid rows of the board
+
+    Attributes:
+        grid (np.array): number of body blocks on each (column, row) cell
+        cells (deque): grid cell of each body block, None if off the grid
+        head (tuple): pixel coordinates of the head at the last update
+
+    Methods:
+        reset(snake): Rebuild the grid from the snake blocks
+        update(snake): Apply the last move of the snake
+    """
+
+    def __init__(self, n_cols:int, n_rows:int):
+        self.n_cols = n_cols
+        self.n_rows = n_rows
+        self.grid = np.zeros((n_cols, n_rows), dtype=np.int16)
+        self.cells = deque()
+        self.head = None
+
+    def _cell(self, x:int, y:int):
+        # Blocks out of the grid (e.g. the initial tail or the block appended
+        # off-screen when the food is eaten) never collide with the head
+        if x % CELL or y % CELL:
+            return None
+        col, row = x//CELL, y//CELL
+        if 0 <= col < self.n_cols and 0 <= row < self.n_rows:
+            return (col, row)
+        return None
+
+    def _add(self, cell:tuple):
+        if cell is not None:
+            self.grid[cell] += 1
+
+    def _remove(self, cell:tuple):
+        if cell is not None:
+            self.grid[cell] -= 1
+
+    def reset(self, snake):
+        """Rebuild the grid from the snake blocks.
+
+        Parameters:
+            snake (Snake): Snake class instance
+        """
+        self.grid[:] = 0
+        self.cells = deque(
+            self._cell(snake.x[i], snake.y[i]) for i in range(snake.len))
+        for cell in self.cells:
+            self._add(cell)
+        self.head = (snake.x[0], snake.y[0])
+
+    def update(self, snake):
+        """Apply the last move of the snake. Nothing is done if the snake did
+        not move since the last update, while the grid is rebuilt if more
+        than one move was missed.
+
+        Parameters:
+            snake (Snake): Snake class instance
+        """
+        head = (snake.x[0], snake.y[0])
+        if head == self.head:
+            return
+        if self.head is None \
+                or abs(head[0]-self.head[0])+abs(head[1]-self.head[1]) != CELL:
+            self.reset(snake)
+            return
+
+        self.cells.appendleft(self._cell(*head))
+        self._add(self.cells[0])
+        self._remove(self.cells.pop())
+        if len(self.cells) < snake.len:
+            # The snake ate: the new block is appended off the grid
+            self.cells.append(None)
+        self.head = head
+
+
+class RayStateEncoder():
+    """Alternative state encoder. For each one of 8 rays cast from the head
+    (forward, forward-right, right, back-right, back, back-left, left,
+    forward-left from the snake POV) it reports the inverse distance of the
+    nearest obstacle, 0 if nothing is met within max_range cells. It also
+    reports the food position in the snake frame, the food distance and the
+    direction of the snake.
+    The wall distances are precomputed once per board, while the body is read
+    from the incrementally updated BodyOccupancy grid of each game, so the
+    encoding cost does not grow with the snake length. Batches of games are
+    encoded with the same vectorized code.
+
+    Parameters:
+        screen_width (int): Width of the game screen in pixels.
+        screen_height (int): Height of the game screen in pixels.
+        max_range (int): maximum ray length in cells. Defaults to the board
+                         size
+
+    Attributes:
+        n_cols (int): number of grid columns of the board
+        n_rows (int): number of grid rows of the board
+        max_range (int): maximum ray length in cells
+        size (int): length of the state vector
+        wall (np.array): distance in cells of the wall from each cell along
+                         each absolute ray direction
+        rays (np.array): absolute ray direction indices for each snake
+                         direction
+
+    Methods:
+        occupancy(snake): Get the updated body occupancy of a game
+        encode(snake, food): Get the state vector of a game
+        encode_batch(snakes, foods): Get the state vectors of many games
+        features(heads, dirs, foods, grids): Vectorized encoder
+    """
+
+    N_RAYS = 8
+
+    def __init__(self, screen_width:int, screen_height:int,
+                 max_range:int=None):
+        self.n_cols = screen_width//CELL
+        self.n_rows = screen_height//CELL
+        # Cells reachable by the head, as in SnakeEnvironment.hit_border()
+        self.max_col = (screen_width-40)//CELL
+        self.max_row = (screen_height-40)//CELL
+        self.max_range = max_range or max(self.n_cols, self.n_rows)
+        self.size = self.N_RAYS + 3 + 4
+
+        # Absolute directions and relative rays of each snake direction
+        vectors = []
+        self.rays = np.zeros((4, self.N_RAYS), dtype=int)
+        for d in range(4):
+            fwd, right = DIRS[d], DIRS[(d+3) % 4]
+            rays = [fwd, fwd+right, right, right-fwd,
+                    -fwd, -fwd-right, -right, fwd-right]
+            for i, ray in enumerate(rays):
+                ray = tuple(ray)
+                if ray not in vectors:
+                    vectors.append(ray)
+                self.rays[d, i] = vectors.index(ray)
+        self.vectors = np.array(vectors)
+        self.wall = self._wall_distances()
+
+        self._games = weakref.WeakKeyDictionary()
+
+    def _wall_distances(self):
+        """Precompute the number of steps from each cell to the first wall
+        cell along each absolute direction, capped at max_range+1.
+
+        Returns:
+            np.array: (direction, column, row) distances
+        """
+        wall = np.zeros(
+            (len(self.vectors), self.n_cols, self.n_rows), dtype=np.int16)
+        for v, (dx, dy) in enumerate(self.vectors):
+            for col in range(self.n_cols):
+                for row in range(self.n_rows):
+                    k = 1
+                    while k <= self.max_range:
+                        c, r = col+k*dx, row+k*dy
+                        if not (1 <= c <= self.max_col
+                                and 1 <= r <= self.max_row):
+                            break
+                        k += 1
+                    wall[v, col, row] = k
+
+        return wall
+
+    def occupancy(self, snake):
+        """Get the body occupancy of a game, updated with the last move.
+
+        Parameters:
+            snake (Snake): Snake class instance
+
+        Returns:
+            BodyOccupancy: the occupancy grid of the game
+        """
+        occ = self._games.get(snake)
+        if occ is None:
+            occ = BodyOccupancy(self.n_cols, self.n_rows)
+            occ.reset(snake)
+            self._games[snake] = occ
+        else:
+            occ.update(snake)
+
+        return occ
+
+    def encode(self, snake, food):
+        """Get the state vector of a game.
+
+        Parameters:
+            snake (Snake): Snake class instance
+            food (Food): Food class instance
+
+        Returns:
+            np.array: the current state vector
+        """
+        return self.encode_batch([snake], [food])[0]
+
+    def encode_batch(self, snakes:list, foods:list):
+        """Get the state vectors of many games at once.
+
+        Parameters:
+            snakes (list): Snake class instances
+            foods (list): Food class instances, one per snake
+
+        Returns:
+            np.array: the state vectors, one row per game
+        """
+        heads = np.array([(s.x[0], s.y[0]) for s in snakes])
+        dirs = np.array([s.dir for s in snakes])
+        food_pos = np.array([f.pos for f in foods])
+        grids = np.stack([self.occupancy(s).grid for s in snakes])
+
+        return self.features(heads, dirs, food_pos, grids)
+
+    def features(self, heads:np.array, dirs:np.array, foods:np.array,
+                 grids:np.array):
+        """Vectorized encoder working on the arrays of a batch of games.
+
+        Parameters:
+            heads (np.array): (N, 2) head pixel coordinates
+            dirs (np.array): (N,) snake directions
+            foods (np.array): (N, 2) food pixel coordinates
+            grids (np.array): (N, n_cols, n_rows) body occupancy grids
+
+        Returns:
+            np.array: (N, size) state vectors
+        """
+        n = heads.shape[0]
+        idx = np.arange(n)
+        cells = heads//CELL
+        cells[:, 0] = np.clip(cells[:, 0], 0, self.n_cols-1)
+        cells[:, 1] = np.clip(cells[:, 1], 0, self.n_rows-1)
+
+        # Wall distance along each ray, read from the precomputed table
+        rays = self.rays[dirs]  # (N, rays)
+        dist = self.wall[rays, cells[:, None, 0], cells[:, None, 1]]
+
+        # Body distance along each ray: march max_range steps at once
+        steps = np.arange(1, self.max_range+1)
+        pos = cells[:, None, None, :] \
+            + steps[None, None, :, None]*self.vectors[rays][:, :, None, :]
+        cols = np.clip(pos[..., 0], 0, self.n_cols-1)
+        rows = np.clip(pos[..., 1], 0, self.n_rows-1)
+        hit = grids[idx[:, None, None], cols, rows] > 0
+        hit &= steps[None, None, :] < dist[:, :, None]
+        body = np.where(hit.any(axis=2), hit.argmax(axis=2)+1, dist)
+        dist = np.minimum(dist, body)
+
+        state = np.zeros((n, self.size), dtype=np.float32)
+        state[:, :self.N_RAYS] = np.where(
+            dist <= self.max_range, 1/dist, 0)
+
+        # Food position in the snake frame, normalized by the board size
+        delta = (foods-heads)/CELL
+        fwd, right = DIRS[dirs], DIRS[(dirs+3) % 4]
+        scale = max(self.n_cols, self.n_rows)
+        state[:, self.N_RAYS] = np.sum(delta*fwd, axis=1)/scale
+        state[:, self.N_RAYS+1] = np.sum(delta*right, axis=1)/scale
+        state[:, self.N_RAYS+2] = np.abs(delta).sum(axis=1)/(2*scale)
+
+        # Direction, in the same order of Agent.get_state: down, up,
+        # right, left
+        state[idx, self.N_RAYS+3+np.array([0, 2, 1, 3])[dirs]] = 1
+
+        return state
@@ -1,39 +1,144 @@
-import random
+import threading
 import numpy as np
 from .deep_q import DeepQNetwork
+from .prefetch import BatchPrefetcher
 
 class ReplayMemory():
     """Replay memory used by the agent. It stores a number of experiences defined
     as (state, action, reward, next state). If the memory capacity is 
-    exceeded, the older experiences are dropped
+    exceeded, the older experiences are dropped. In n-step mode the
+    experiences are defined as (state, action, n-step return, state n steps
+    later, done, discount), see NStepAccumulator. The experiences are stored
+    in preallocated column arrays (the table), one row per slot, and the
+    FIFO order is kept by a ring of slot IDs, so that a batch is gathered
+    with a single indexing per column.
 
     Parameters:
         model (agent.DeepQNetwork): DQN model
         capacity (int): memory capacity
         batch_size (int): number of samples to retrieve from the memory
         gamma (float): discounting factor for the Deep Q-Learning
+        n_step (int): number of steps of the returns. Defaults to 1
+        mask_fn (callable): optional function mapping a batch of states to
+                            the boolean mask of their valid actions
+        mix_ratio (float): fraction of each batch drawn from the prefill
+                           store, when it is not empty
 
     Attributes:
         model (DeepQNetwork): DQN model
         capacity (int): memory capacity
-        memory (list): actual memory
+        ring (np.array): int32 slot IDs of the stored experiences, in push
+                         order
         push_count (int): number of performed updates
         batch_size (int): number of experiences to randomly sample 
+        n_step (int): number of steps of the returns
+        prefetcher (BatchPrefetcher): background batch sampler, if started
+        mask_fn (callable): valid actions mask function, if any
+        demo_ids (np.array): int32 slot IDs of the prefill experiences
+        mix_ratio (float): fraction of each batch drawn from the demos
     
     Methods:
         push(experience): Update the agent's replay memory
-        sample(): Perform a random sample of the memory
+        prefill(experiences): Fill the prefill store in bulk
+        sample(): Sample the slot IDs of a batch
+        all_experiences(): Get the slot IDs of the whole memory
+        build_batch(batch, stop): Gather the experiences into arrays
+        sample_batch(stop): Sample and gather a batch atomically
+        start_prefetch(depth, max_staleness): Sample the batches in background
+        stop_prefetch(): Stop the background sampling
+        masked(q, states): Exclude the invalid actions from the Q-values
         replay(stop): Predict the Q-value of the (next state, action) pairs
         exploit(): Choose the best action exploiting the trained networks
+        exploit_batch(states): Choose the best actions for a batch of states
     """
 
-    def __init__(self, model:DeepQNetwork, capacity:int, batch_size:int, gamma:float):
+    def __init__(self, model:DeepQNetwork, capacity:int, batch_size:int, gamma:float,
+                 n_step:int=1, mask_fn=None, mix_ratio:float=.25):
         self.model = model.model
-        self.batch_size = batch_size
-        self.capacity = capacity
+        self.batch_size = int(batch_size)
+        self.capacity = int(capacity)
         self.gamma = gamma
-        self.memory = []
+        self.n_step = int(n_step)
+        self.ring = np.zeros(self.capacity, dtype=np.int32)
         self.push_count = 0
+        self.prefetcher = None
+        self.mask_fn = mask_fn
+        self.demo_ids = np.zeros(0, dtype=np.int32)
+        self.mix_ratio = mix_ratio
+        self._size = 0
+        self._table = None
+        self._n_slots = 0
+        self._free = []
+        self._rng = np.random.default_rng()
+        # Sampling and gathering a batch must not interleave with a push,
+        # which may free and reuse the slots of the batch
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size + len(self.demo_ids)
+
+    def _grow(self, state_size:int, rows:int):
+        """Allocate the table with the given number of rows, copying the
+        current content. The new columns are filled before being swapped
+        in, so a concurrent reader always sees a complete table.
+
+        """
+        table = {
+            'state': np.zeros((rows, state_size), dtype=np.float32),
+            'act': np.zeros(rows, dtype=np.int64),
+            'reward': np.zeros(rows, dtype=np.float32),
+            'nxt_state': np.zeros((rows, state_size), dtype=np.float32),
+            # -1 for the 1-step experiences, whose done flag is the stop
+            # argument of replay()
+            'done': np.zeros(rows, dtype=np.float32),
+            'discount': np.zeros(rows, dtype=np.float32),
+        }
+        if self._table is not None:
+            for name, column in self._table.items():
+                table[name][:len(column)] = column
+        self._table = table
+
+    @staticmethod
+    def _columns(experience:tuple, gamma:float):
+        """Convert an experience into the values of the table columns.
+
+        """
+        state = np.asarray(experience[0], dtype=np.float32).ravel()
+        nxt_state = np.asarray(experience[3], dtype=np.float32).ravel()
+        if len(experience) > 4:
+            done, discount = float(experience[4]), float(experience[5])
+        else:
+            done, discount = -1., gamma
+
+        return (state, int(experience[1]), float(experience[2]), nxt_state,
+                done, discount)
+
+    def _acquire(self, experience:tuple):
+        """Store an experience in a free slot of the table.
+
+        Returns:
+            int: the slot ID
+        """
+        values = self._columns(experience, self.gamma)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._n_slots
+            if self._table is None:
+                self._grow(len(values[0]), 1024)
+            elif slot == len(self._table['act']):
+                self._grow(len(values[0]), 2*slot)
+            self._n_slots += 1
+        for column, value in zip(self._table.values(), values):
+            column[slot] = value
+
+        return slot
+
+    def _release(self, slot:int):
+        """Free the slot of a dropped experience.
+
+        """
+        self._free.append(slot)
 
     def push(self, experience:tuple):
         """Update the agent's replay memory. If the memory capacity is 
@@ -44,23 +149,143 @@ class ReplayMemory():
                                 (state, action, reward, next state)
 
         """
-        if len(self.memory) < self.capacity:
-            # Start achieving memory from experience
-            self.memory.append(experience)
-        else:
-            # Progressively replace the acquired experience
-            # with fresher one
-            self.memory[self.push_count % self.capacity] = experience
-        self.push_count += 1
+        with self._lock:
+            pos = self.push_count % self.capacity
+            if self._size == self.capacity:
+                # Progressively replace the acquired experience
+                # with fresher one
+                self._release(int(self.ring[pos]))
+            else:
+                self._size += 1
+            self.ring[pos] = self._acquire(experience)
+            self.push_count += 1
+
+    def prefill(self, experiences:list):
+        """Fill the prefill store in bulk, e.g. with the transitions of a
+        scripted policy generated before training. The store is kept apart
+        from the on-policy experiences and never evicted by push().
+
+        Parameters:
+            experiences (list): the experiences, up to the memory capacity
+        """
+        with self._lock:
+            for slot in self.demo_ids:
+                self._release(int(slot))
+            self.demo_ids = np.array(
+                [self._acquire(e) for e in experiences[:self.capacity]],
+                dtype=np.int32)
 
     def sample(self):
-        """Perform a random sample of the memory
+        """Sample the slot IDs of a batch, without replacement. When the
+        prefill store is not empty a mix_ratio fraction of the batch is drawn
+        from it, or more while the on-policy experiences are too few.
 
         Returns:
-            np.array: the batch sampled from the memory
+            np.array: the slot IDs of the batch
         """
+        n_demos = 0
+        if len(self.demo_ids):
+            n_demos = max(round(self.mix_ratio*self.batch_size),
+                          self.batch_size-self._size)
+            n_demos = min(n_demos, len(self.demo_ids))
         # Randomly sample memory
-        return random.sample(self.memory, self.batch_size)
+        ids = self.ring[self._rng.choice(
+            self._size, self.batch_size-n_demos, replace=False)]
+        if n_demos:
+            demos = self.demo_ids[self._rng.choice(
+                len(self.demo_ids), n_demos, replace=False)]
+            ids = np.concatenate([ids, demos])
+
+        return ids
+
+    def all_experiences(self):
+        """Get the slot IDs of the whole memory, used as batch while the
+        memory holds less than a batch.
+
+        Returns:
+            np.array: the slot IDs of the on-policy and prefill experiences
+        """
+        return np.concatenate([self.ring[:self._size], self.demo_ids])
+
+    def build_batch(self, batch:np.array, stop:bool):
+        """Gather the experiences of a batch from the table into the arrays
+        used for training. The 1-step experiences are bootstrapped with gamma
+        unless stop is set, the n-step ones use their own done flag and
+        discount.
+
+        Parameters:
+            batch (np.array): slot IDs sampled from the memory
+            stop (bool): true if the snake died
+
+        Returns:
+            tuple: states, actions, returns, next states, done flags and
+                   discounts arrays
+        """
+        table = self._table
+        done = table['done'][batch]
+        done[done < 0] = float(stop)
+
+        return (table['state'][batch], table['act'][batch],
+                table['reward'][batch], table['nxt_state'][batch], done,
+                table['discount'][batch])
+
+    def sample_batch(self, stop:bool):
+        """Sample a batch and gather it into the training arrays while no
+        push can free its slots. The whole memory is used while it holds
+        less than a batch.
+
+        Parameters:
+            stop (bool): true if the snake died
+
+        Returns:
+            tuple: the arrays returned by build_batch()
+        """
+        with self._lock:
+            if len(self) >= self.batch_size:
+                batch = self.sample()
+            else:
+                batch = self.all_experiences()
+
+            return self.build_batch(batch, stop)
+
+    def start_prefetch(self, depth:int=4, max_staleness:int=None):
+        """Start sampling and assembling the batches in a background thread.
+
+        Parameters:
+            depth (int): maximum number of ready batches
+            max_staleness (int): maximum number of pushes performed since a
+                                 batch was sampled. None to disable the check
+        """
+        self.stop_prefetch()
+        self.prefetcher = BatchPrefetcher(self, depth, max_staleness)
+        self.prefetcher.start()
+
+    def stop_prefetch(self):
+        """Stop the background sampling.
+
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
+    def masked(self, q:np.array, states:np.array):
+        """Exclude the invalid actions from the Q-values by setting them to
+        -inf, so that they are never chosen by an argmax or a max.
+
+        Parameters:
+            q (np.array): Q-values, one row per state
+            states (np.array): states, one row per Q-values row
+
+        Returns:
+            np.array: the masked Q-values
+        """
+        if self.mask_fn is None:
+            return q
+        mask = self.mask_fn(states)
+        if mask is None:
+            return q
+
+        return np.where(mask, q, -np.inf)
 
     def replay(self, stop:bool):
         """Predict the Q-value of the (next state, action) pairs. Get the 
@@ -68,7 +293,8 @@ class ReplayMemory():
         the (current state, action) pairs. Replace the obtained value with the 
         discounted greatest Q-value in correspondence of the considered action.
         Train the network with the new discounted Q-values when the current 
-        state is used as input. 
+        state is used as input. The n-step experiences are bootstrapped with
+        their stored discount.
 
         Parameters:
             stop (bool): true if the snake died
@@ -76,52 +302,35 @@ class ReplayMemory():
         Returns:
             _type_: the training history
         """
-        # Get the random sampled memory
-        if len(self.memory) >= self.batch_size:
-            batch = self.sample()
-        else:
-            batch = self.memory
-
-        # Reshape the experience
-        state, act, reward, nxt_state = batch[0]
-        nxt_state = np.reshape(nxt_state, (1, 11))
-        state = np.reshape(state, (1, 11))
-        reward = np.asarray(reward)
-        act = np.asarray(act)
-
-        # Build the input dataset
-        if len(batch) > 1:
-            for state1, act1, reward1, nxt_state1 in batch[1:]:
-                nxt_state1 = np.reshape(nxt_state1, (1, 11))
-                nxt_state = np.vstack((nxt_state, nxt_state1))
-
-                reward1 = np.asarray(reward1)
-                reward = np.vstack((reward, reward1))
+        # In n-step mode the first experiences are still in the window
+        if not len(self):
+            return {'loss': [np.nan], 'accuracy': [np.nan]}
 
-                state1 = np.reshape(state1, (1, 11))
-                state = np.vstack((state, state1))
+        # Get a ready batch. When the snake died the 1-step experiences must
+        # not be bootstrapped, so the batch is built here
+        arrays = None
+        if self.prefetcher is not None and not stop:
+            arrays = self.prefetcher.get()
 
-                act1 = np.asarray(act1)
-                act = np.vstack((act, act1))
+        if arrays is None:
+            # Get the random sampled memory as input dataset
+            arrays = self.sample_batch(stop)
+        state, act, reward, nxt_state, done, discount = arrays
         q_opt = reward
 
-        if not stop:
+        if not np.all(done):
             # Predict the Q-value of the next state
             q_prime = self.model.predict(nxt_state)
-            # Get the action providing the greatest one
-            max_q_prime = np.amax(q_prime, axis=1)
-            max_q_prime = np.reshape(max_q_prime, (q_prime.shape[0], 1))
-            # Comput the discounted return wrt the greatest qvalue
-            q_opt = np.add(reward, self.gamma * max_q_prime)
+            # Get the valid action providing the greatest one
+            max_q_prime = np.amax(self.masked(q_prime, nxt_state), axis=1)
+            # Comput the discounted return wrt the greatest qvalue. The
+            # terminal states are not bootstrapped
+            q_opt = reward + discount * max_q_prime * (1 - done)
         # Predict the Q-value of the current state    
         target = self.model.predict(state)
         # Replace the current Q-value with the discounted return in 
         # correspondence of the action ensuring the greatest next Q-value
-        try:
-            for i in range(act.shape[0]):
-                target[i, int(act[i])] = q_opt[i]
-        except IndexError:
-            target[0, int(act)] = q_opt
+        target[np.arange(target.shape[0]), act] = q_opt
         # Train the model with the new current Q-values
         history = self.model.fit(
             state, target, epochs=1,
@@ -139,8 +348,25 @@ class ReplayMemory():
         Returns:
             int: the action to perform predicted by the DQN
         """
-        state = np.reshape(state, (1, 11))
-        pred = self.model.predict(state)[0]
+        state = np.reshape(state, (1, -1))
+        pred = self.masked(self.model.predict(state), state)[0]
         best_act = np.argmax(pred)
 
         return best_act
+
+
+    def exploit_batch(self, states:np.array):
+        """Choose the best action for a batch of states with a single forward
+        pass of the trained network
+
+        Parameters:
+            states (np.array): state vectors, one row per game
+
+        Returns:
+            np.array: the actions to perform predicted by the DQN
+        """
+        states = np.reshape(states, (len(states), -1))
+        pred = self.masked(self.model.predict(states, verbose=0), states)
+        best_acts = np.argmax(pred, axis=1)
+
+        return best_acts
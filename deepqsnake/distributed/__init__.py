@@ -0,0 +1,15 @@
+import importlib
+
+_LAZY = {
+    'IngestServer': '.ingest',
+    'RemoteActor': '.actor',
+    'run_actor': '.actor',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,177 @@
+import time
+import socket
+import random
+import numpy as np
+from . import wire
+from ..agent.numpy_policy import NumpyPolicy
+
+class RemoteActor():
+    """Actor-side client of the IngestServer. It pushes compressed batches of
+    transitions, backing off while the learner answers BUSY, and pulls the
+    latest weights.
+
+    Parameters:
+        address (tuple or str): (host, port) for TCP, a path for a Unix
+                                socket
+        timeout (float): socket timeout in seconds, also used as the time
+                         allowed to the learner to start listening
+
+    Attributes:
+        version (int): version of the last weights pulled
+        retries (int): number of pushes delayed by backpressure
+
+    Methods:
+        push(transitions): Send a batch of transitions to the learner
+        pull_weights(): Get the weights if newer than the last pulled
+        close(): Close the connection
+    """
+
+    def __init__(self, address, timeout:float=30):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        deadline = time.monotonic() + timeout
+        while True:
+            self.sock = socket.socket(family, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(address)
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                self.sock.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(.5)
+        self.version = 0
+        self.retries = 0
+
+    def push(self, transitions:list):
+        """Send a batch of transitions to the learner. While the learner's
+        queue is full the push is retried after the suggested back off.
+
+        Parameters:
+            transitions (list): the transitions to send
+
+        Returns:
+            int: version of the weights published by the learner
+        """
+        packet = wire.encode_transitions(transitions)
+        while True:
+            wire.send_message(self.sock, wire.PUSH, packet, compress=True)
+            msg_type, payload = wire.recv_message(self.sock)
+            if msg_type == wire.ACK:
+                _, version = wire.ACK_BODY.unpack(payload)
+                return version
+            if msg_type != wire.BUSY:
+                raise wire.WireError('Transitions rejected by the learner')
+            self.retries += 1
+            retry_after, = wire.BUSY_BODY.unpack(payload)
+            time.sleep(retry_after)
+
+    def pull_weights(self):
+        """Get the latest weights if newer than the last pulled ones.
+
+        Returns:
+            list: the weights arrays, None if not newer
+        """
+        wire.send_message(
+            self.sock, wire.GET_WEIGHTS, wire.VERSION_BODY.pack(self.version))
+        msg_type, payload = wire.recv_message(self.sock)
+        if msg_type != wire.WEIGHTS:
+            raise wire.WireError('Unexpected answer to the weights request')
+        version, weights = wire.decode_weights(payload)
+        if not weights:
+            return None
+        self.version = version
+
+        return weights
+
+    def close(self):
+        """Close the connection.
+
+        """
+        self.sock.close()
+
+
+def run_actor(address, agent, episodes:int, batch_size:int=256,
+              gamma:float=.9, max_steps:int=None,
+              max_steps_since_food:float=2, detect_loops:bool=False,
+              stat=None):
+    """Play headless games and stream the transitions to the learner. The
+    actions are chosen with the epsilon greedy strategy on a NumPy copy of
+    the learner's network, refreshed whenever the learner publishes new
+    weights. Each transition carries its own done flag and discount. The
+    episode budgets end the games the policy would play forever; those
+    transitions are not terminal.
+
+    Parameters:
+        address (tuple or str): address of the IngestServer
+        agent (Agent): agent providing the states, rewards and epsilon
+        episodes (int): number of games to play
+        batch_size (int): transitions per pushed batch
+        gamma (float): discounting factor stored with the transitions
+        max_steps (int): maximum steps per game, None for no limit
+        max_steps_since_food (float): steps without food ending a game, as a
+                                      multiple of the board cells
+        detect_loops (bool): end the games stuck in a loop
+        stat (Statistics): statistics counting the termination reasons of
+                           all the games. Defaults to a new one
+
+    Returns:
+        int: number of transitions sent
+    """
+    from ..stats.stats import Statistics
+    from ..environment.environment import SnakeEnvironment
+
+    if stat is None:
+        stat = Statistics()
+    client = RemoteActor(address)
+    policy = None
+    weights = client.pull_weights()
+    if weights is not None:
+        policy = NumpyPolicy(weights)
+
+    buffer = []
+    sent = 0
+    for episode in range(episodes):
+        env = SnakeEnvironment(
+            screen_width=agent.screen_width,
+            screen_height=agent.screen_height,
+            stat=stat,
+            episode=episode,
+            agent=agent,
+            train=False,
+            display=False,
+            max_steps=max_steps,
+            max_steps_since_food=max_steps_since_food,
+            detect_loops=detect_loops,
+            fps=None
+        )
+        while not env.stop:
+            env.step_ctr += 1
+            state1 = agent.get_state(env.snake, env.food)
+            env.eps = agent.get_epsilon(env.step_ctr)
+            if policy is None or random.random() < env.eps:
+                action = agent.random_action(state1)
+            else:
+                state = np.reshape(state1, (1, -1))
+                q = agent.memory.masked(policy.predict(state), state)
+                action = int(np.argmax(q[0]))
+            env.step(action, state1)
+            state2 = agent.get_state(env.snake, env.food)
+            buffer.append((state1, action, env.reward, state2, env.died, gamma))
+
+            if len(buffer) >= batch_size:
+                version = client.push(buffer)
+                sent += len(buffer)
+                buffer = []
+                if version > client.version:
+                    weights = client.pull_weights()
+                    if weights is not None:
+                        policy = NumpyPolicy(weights)
+        del env
+
+    if buffer:
+        client.push(buffer)
+        sent += len(buffer)
+    client.close()
+
+    return sent
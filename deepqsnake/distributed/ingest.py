@@ -0,0 +1,183 @@
+import os
+import queue
+import struct
+import threading
+import socketserver
+from . import wire
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class IngestServer():
+    """Learner-side ingestion service. Remote actors connect over TCP or a
+    Unix socket and push compressed batches of transitions, which are queued
+    and appended to the replay memory by the learner thread with drain().
+    The actors also pull the latest weights published by the learner.
+    The queue of pending batches is bounded: when it is full the pushes are
+    answered with BUSY and the actors back off and retry.
+
+    Parameters:
+        memory (ReplayMemory): the learner's replay memory
+        address (tuple or str): (host, port) for TCP, a path for a Unix
+                                socket
+        max_pending (int): maximum number of batches waiting for drain()
+        retry_after (float): back off time in seconds suggested to the
+                             actors when the queue is full
+
+    Attributes:
+        memory (ReplayMemory): the learner's replay memory
+        address (tuple or str): bound address
+        pending (queue.Queue): batches waiting to be appended to the memory
+        version (int): version of the published weights
+        received (int): number of transitions received
+        rejected (int): number of batches rejected for backpressure
+
+    Methods:
+        start(): Start serving in a background thread
+        stop(): Stop the server
+        drain(max_batches): Append the pending batches to the memory
+        publish_weights(weights): Publish new weights for the actors
+    """
+
+    def __init__(self, memory, address, max_pending:int=64,
+                 retry_after:float=.05):
+        self.memory = memory
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.retry_after = retry_after
+        self.version = 0
+        self.received = 0
+        self.rejected = 0
+        self._weights = wire.encode_weights(0, [])
+        self._lock = threading.Lock()
+
+        ingest = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(handler):
+                while True:
+                    try:
+                        msg_type, payload = wire.recv_message(handler.request)
+                    except (ConnectionError, OSError):
+                        return
+                    except wire.WireError:
+                        wire.send_message(handler.request, wire.ERROR)
+                        return
+                    ingest._dispatch(handler.request, msg_type, payload)
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self._server = _UnixServer(address, Handler)
+        else:
+            self._server = _TCPServer(address, Handler)
+        self.address = self._server.server_address
+        self._thread = None
+
+    def _dispatch(self, sock, msg_type:int, payload:bytes):
+        """Serve a single request of an actor.
+
+        """
+        if msg_type == wire.PUSH:
+            try:
+                transitions = wire.decode_transitions(payload)
+            except (wire.WireError, ValueError):
+                wire.send_message(sock, wire.ERROR)
+                return
+            try:
+                self.pending.put_nowait(transitions)
+            except queue.Full:
+                # Backpressure: the learner is not keeping up
+                with self._lock:
+                    self.rejected += 1
+                wire.send_message(
+                    sock, wire.BUSY, wire.BUSY_BODY.pack(self.retry_after))
+                return
+            with self._lock:
+                self.received += len(transitions)
+                version = self.version
+            wire.send_message(
+                sock, wire.ACK, wire.ACK_BODY.pack(len(transitions), version))
+        elif msg_type == wire.GET_WEIGHTS:
+            try:
+                known, = wire.VERSION_BODY.unpack(payload)
+            except struct.error:
+                wire.send_message(sock, wire.ERROR)
+                return
+            with self._lock:
+                if known < self.version:
+                    packet = self._weights
+                else:
+                    packet = wire.encode_weights(self.version, [])
+            wire.send_message(sock, wire.WEIGHTS, packet, compress=True)
+        else:
+            wire.send_message(sock, wire.ERROR)
+
+    def start(self):
+        """Start serving in a background thread.
+
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server.
+
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def drain(self, max_batches:int=None):
+        """Append the pending batches to the replay memory. It must be called
+        by the thread training on the memory.
+
+        Parameters:
+            max_batches (int): maximum number of batches to append, None for
+                               all the pending ones
+
+        Returns:
+            int: number of transitions appended
+        """
+        count = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            try:
+                transitions = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            for transition in transitions:
+                self.memory.push(transition)
+            count += len(transitions)
+            batches += 1
+
+        return count
+
+    def publish_weights(self, weights:list):
+        """Publish new weights for the actors.
+
+        Parameters:
+            weights (list): [kernel, bias, ...] arrays, as returned by
+                            keras.Model.get_weights()
+
+        Returns:
+            int: the new weights version
+        """
+        with self._lock:
+            version = self.version + 1
+        packet = wire.encode_weights(version, weights)
+        with self._lock:
+            self.version = version
+            self._weights = packet
+
+        return version
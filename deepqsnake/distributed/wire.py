@@ -0,0 +1,201 @@
+import zlib
+import struct
+import numpy as np
+
+# Message header: magic, version, message type, flags, payload length
+HEADER = struct.Struct('!4sBBHI')
+MAGIC = b'DQSN'
+VERSION = 1
+MAX_PAYLOAD = 1 << 28
+
+# Message types
+PUSH = 1  # actor -> learner: compressed batch of transitions
+ACK = 2  # learner -> actor: accepted transitions and weights version
+BUSY = 3  # learner -> actor: ingestion queue full, retry later
+GET_WEIGHTS = 4  # actor -> learner: weights version held by the actor
+WEIGHTS = 5  # learner -> actor: latest weights, empty if not newer
+ERROR = 6  # learner -> actor: malformed request
+
+# Flags
+COMPRESSED = 1
+
+# Transitions packet: count, state size, fields per transition
+BATCH = struct.Struct('!IHB')
+ACK_BODY = struct.Struct('!IQ')
+BUSY_BODY = struct.Struct('!f')
+VERSION_BODY = struct.Struct('!Q')
+WEIGHTS_BODY = struct.Struct('!QH')
+
+
+class WireError(Exception):
+    """Raised when a malformed message is received."""
+
+
+def _recv_exact(sock, size:int):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size-len(buf))
+        if not chunk:
+            raise ConnectionError('Connection closed by peer')
+        buf += chunk
+
+    return bytes(buf)
+
+
+def send_message(sock, msg_type:int, payload:bytes=b'', compress:bool=False):
+    """Send a message, optionally compressing its payload with zlib.
+
+    Parameters:
+        sock (socket.socket): connected socket
+        msg_type (int): message type
+        payload (bytes): message body
+        compress (bool): true to compress the payload
+    """
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload, 1)
+        flags |= COMPRESSED
+    sock.sendall(HEADER.pack(MAGIC, VERSION, msg_type, flags, len(payload))
+                 + payload)
+
+
+def recv_message(sock):
+    """Receive a message and decompress its payload.
+
+    Parameters:
+        sock (socket.socket): connected socket
+
+    Returns:
+        tuple: (message type, payload)
+    """
+    magic, version, msg_type, flags, size = HEADER.unpack(
+        _recv_exact(sock, HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise WireError('Unknown protocol')
+    if size > MAX_PAYLOAD:
+        raise WireError(f'Payload too large: {size} bytes')
+    payload = _recv_exact(sock, size)
+    if flags & COMPRESSED:
+        # MAX_PAYLOAD also bounds the decompressed size
+        inflater = zlib.decompressobj()
+        try:
+            payload = inflater.decompress(payload, MAX_PAYLOAD)
+        except zlib.error as e:
+            raise WireError(f'Corrupted payload: {e}')
+        if inflater.unconsumed_tail or not inflater.eof:
+            raise WireError('Decompressed payload too large or truncated')
+
+    return msg_type, payload
+
+
+def encode_transitions(transitions:list):
+    """Pack a batch of transitions in columnar arrays. The transitions are
+    either (state, action, reward, next state) or (state, action, reward,
+    next state, done, discount) tuples, all of the same kind.
+
+    Parameters:
+        transitions (list): the transitions to pack
+
+    Returns:
+        bytes: the packet
+    """
+    n = len(transitions)
+    fields = len(transitions[0])
+    states = np.array([t[0] for t in transitions], dtype='>f4').reshape(n, -1)
+    parts = [
+        BATCH.pack(n, states.shape[1], fields),
+        states.tobytes(),
+        np.array([t[1] for t in transitions], dtype='u1').tobytes(),
+        np.array([t[2] for t in transitions], dtype='>f4').tobytes(),
+        np.array([t[3] for t in transitions], dtype='>f4').tobytes(),
+    ]
+    if fields == 6:
+        parts.append(np.array([t[4] for t in transitions], 'u1').tobytes())
+        parts.append(np.array([t[5] for t in transitions], '>f4').tobytes())
+
+    return b''.join(parts)
+
+
+def decode_transitions(packet:bytes):
+    """Unpack a batch of transitions packed by encode_transitions().
+
+    Parameters:
+        packet (bytes): the packet
+
+    Returns:
+        list: the transitions
+    """
+    try:
+        n, size, fields = BATCH.unpack_from(packet)
+    except struct.error:
+        raise WireError('Truncated transitions packet')
+    if fields not in (4, 6):
+        raise WireError(f'Unknown transition kind: {fields} fields')
+    expected = BATCH.size + n*(8*size+5) + (5*n if fields == 6 else 0)
+    if len(packet) != expected:
+        raise WireError('Truncated transitions packet')
+
+    offset = BATCH.size
+    def take(dtype, count, shape):
+        nonlocal offset
+        arr = np.frombuffer(packet, dtype, count, offset)
+        offset += arr.nbytes
+        return arr.astype(dtype.lstrip('>')).reshape(shape)
+    states = take('>f4', n*size, (n, size))
+    actions = take('u1', n, n)
+    rewards = take('>f4', n, n)
+    nxt_states = take('>f4', n*size, (n, size))
+    if fields == 4:
+        return [(states[i], int(actions[i]), float(rewards[i]), nxt_states[i])
+                for i in range(n)]
+    done = take('u1', n, n)
+    discount = take('>f4', n, n)
+
+    return [(states[i], int(actions[i]), float(rewards[i]), nxt_states[i],
+             bool(done[i]), float(discount[i])) for i in range(n)]
+
+
+def encode_weights(version:int, weights:list):
+    """Pack the weights of the DQN.
+
+    Parameters:
+        version (int): weights version
+        weights (list): [kernel, bias, ...] arrays, empty if not newer
+
+    Returns:
+        bytes: the packet
+    """
+    parts = [WEIGHTS_BODY.pack(version, len(weights))]
+    for w in weights:
+        w = np.asarray(w, dtype='>f4')
+        parts.append(struct.pack(f'!B{w.ndim}I', w.ndim, *w.shape))
+        parts.append(w.tobytes())
+
+    return b''.join(parts)
+
+
+def decode_weights(packet:bytes):
+    """Unpack the weights packed by encode_weights().
+
+    Parameters:
+        packet (bytes): the packet
+
+    Returns:
+        tuple: (weights version, list of float32 arrays)
+    """
+    try:
+        version, n_arrays = WEIGHTS_BODY.unpack_from(packet)
+        offset = WEIGHTS_BODY.size
+        weights = []
+        for _ in range(n_arrays):
+            ndim = packet[offset]
+            shape = struct.unpack_from(f'!{ndim}I', packet, offset+1)
+            offset += 1 + 4*ndim
+            count = int(np.prod(shape))
+            w = np.frombuffer(packet, '>f4', count, offset)
+            offset += 4*count
+            weights.append(w.astype(np.float32).reshape(shape))
+    except (struct.error, IndexError, ValueError):
+        raise WireError('Truncated weights packet')
+
+    return version, weights
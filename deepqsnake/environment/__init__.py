@@ -1 +1,15 @@
-from .environment import SnakeEnvironment
\ No newline at end of file
+import importlib
+
+_LAZY = {
+    'SnakeEnvironment': '.environment',
+    'Snake': '.snake',
+    'Food': '.food',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
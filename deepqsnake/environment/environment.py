@@ -1,10 +1,11 @@
-import pygame
 import random
 import numpy as np
 from .food import Food
 from .snake import Snake
 from ..agent.agent import Agent
-from deepqsnake.stats import Statistics
+from ..agent.n_step import NStepAccumulator
+from ..stats.stats import Statistics
+from ..stats.telemetry import Telemetry
 
 
 class SnakeEnvironment():
@@ -24,6 +25,17 @@ class SnakeEnvironment():
         agent (Agent): An instance of the Agent class representing the DQL agent.
         train (bool): Flag indicating whether the environment is in training mode.
         display (bool): Flag indicating whether to display the game visually.
+        telemetry (Telemetry): Optional registry receiving the live metrics.
+        raster (bool): Flag indicating whether to render the board through a
+                       NumPy pixel array instead of per-block blits.
+        max_steps (int): Optional maximum number of steps of the episode.
+        max_steps_since_food (float): Optional maximum number of steps
+                                      without eating, as a multiple of the
+                                      number of cells of the board.
+        detect_loops (bool): Flag indicating whether to end the episode when
+                             the same (head, direction, body) state repeats
+                             before eating.
+        fps (int): Maximum steps per second, None to run unthrottled.
 
     Attributes:
         width (int): Width of the game screen.
@@ -33,30 +45,48 @@ class SnakeEnvironment():
         agent (Agent): DQL agent object.
         train (bool): Training mode flag.
         display (bool): Display mode flag.
+        telemetry (Telemetry): Live metrics registry, if any.
+        raster (bool): Array rendering flag.
+        fps (int): Maximum steps per second, if any.
+        board (pygame.Surface): Board surface receiving the pixel array.
         state (list): Current state of the environment.
         reward (int): Current reward value.
         score (int): Current game score.
         action (int): Current action being performed.
         eps (float): Current epsilon value for epsilon-greedy strategy.
         stop (bool): Flag indicating if the game should stop.
+        died (bool): Flag indicating if the snake died.
+        termination (str): Why the game stopped: 'died', 'max_steps',
+                           'starvation' or 'loop'. None while running.
         step_ctr (int): Counter for the number of steps taken.
+        food_ctr (int): Counter for the steps since the last food.
         explore_ctr (int): Counter for exploration actions.
         exploit_ctr (int): Counter for exploitation actions.
         screen (pygame.Surface): Pygame screen object for display.
         snake (Snake): Snake object representing the player.
         food (Food): Food object representing the target.
+        n_step (NStepAccumulator): n-step window of the game, None if the
+                                   agent's memory stores 1-step experiences.
 
     Methods:
         render(): Renders the game state on the screen.
+        frame(): Rasterizes the board into a NumPy pixel array.
         step(act: int, state: np.array): Performs a single step in the game.
         run(): Runs the main game loop.
+        remember(experience): Stores an experience in the agent's memory.
+        report(): Updates the live metrics.
         self_eat(): Checks if the snake has eaten itself.
         food_eat(): Checks if the snake has eaten the food.
         hit_border(): Checks if the snake has hit the border.
+        check_budgets(ate): Ends endless episodes.
+        terminate(reason): Stops the game recording the reason.
     """
 
     def __init__(self, screen_width: int, screen_height: int, stat: Statistics,
-                 episode: int, agent: Agent, train: bool, display: bool):
+                 episode: int, agent: Agent, train: bool, display: bool,
+                 telemetry: Telemetry = None, raster: bool = False,
+                 max_steps: int = None, max_steps_since_food: float = None,
+                 detect_loops: bool = False, fps: int = 1000):
         self.width = screen_width
         self.height = screen_height
         self.stat = stat
@@ -64,6 +94,10 @@ class SnakeEnvironment():
         self.agent = agent
         self.train = train
         self.display = display
+        self.telemetry = telemetry
+        self.raster = raster
+        self._frame = None
+        self.fps = fps
 
         # Initial state
         self.state = []
@@ -74,23 +108,47 @@ class SnakeEnvironment():
         self.action = 0
         self.eps = 0
         self.stop = False
+        self.died = False
+        self.termination = None
+
+        # Step budgets and loop detection
+        self.max_steps = max_steps
+        self.starvation_limit = None
+        if max_steps_since_food is not None:
+            cells = (self.width//20)*(self.height//20)
+            self.starvation_limit = int(max_steps_since_food*cells)
+        self.detect_loops = detect_loops
+        self.seen = set()
 
         # Counters
         self.step_ctr = 0
+        self.food_ctr = 0
         self.explore_ctr = 0
         self.exploit_ctr = 0
 
         # Screen definition
-        self.f = pygame.font.SysFont('Arial', 16)
-        self.clock = pygame.time.Clock()
+        # pygame is only imported to display the game or throttle it
+        self.clock = None
+        if self.fps is not None:
+            import pygame
+            self.clock = pygame.time.Clock()
         if self.display:
+            import pygame
+            self.f = pygame.font.SysFont('Arial', 16)
             self.screen = pygame.display.set_mode((1020, 620))
-        pygame.display.set_caption('Snake')
+            self.board = pygame.Surface((self.width, self.height))
+            pygame.display.set_caption('Snake')
 
         # Generate snake and food
         self.snake = Snake()
         self.food = Food(self.width, self.height)
 
+        # n-step returns window
+        self.n_step = None
+        if self.agent.memory.n_step > 1:
+            self.n_step = NStepAccumulator(
+                self.agent.memory.n_step, self.agent.memory.gamma)
+
     def render(self):
         """Render the pygame images displaying the game UI with additional 
         information about the DQN performances. During training the metrics
@@ -98,20 +156,27 @@ class SnakeEnvironment():
         network representing the input and ouput layers is displayed.
 
         """
+        import pygame
+
         # Refill the screen
         self.screen.fill((22, 29, 31))
 
-        # Render the snake
-        for i in range(0, self.snake.len):
-            self.screen.blit(
-                self.snake.img, (self.snake.x[i], self.snake.y[i]))
-            self.screen.blit(self.snake.bord1,
-                             (self.snake.x[i], self.snake.y[i]))
-            self.screen.blit(self.snake.bord2,
-                             (self.snake.x[i], self.snake.y[i]))
-
-        # Render the food
-        self.screen.blit(self.food.img, self.food.pos)
+        if self.raster:
+            # Render the board with a single array blit
+            pygame.surfarray.blit_array(self.board, self.frame())
+            self.screen.blit(self.board, (0, 0))
+        else:
+            # Render the snake
+            for i in range(0, self.snake.len):
+                self.screen.blit(
+                    self.snake.img, (self.snake.x[i], self.snake.y[i]))
+                self.screen.blit(self.snake.bord1,
+                                 (self.snake.x[i], self.snake.y[i]))
+                self.screen.blit(self.snake.bord2,
+                                 (self.snake.x[i], self.snake.y[i]))
+
+            # Render the food
+            self.screen.blit(self.food.img, self.food.pos)
 
         # Render the score
         txt = f'Score: {self.score}'
@@ -127,25 +192,27 @@ class SnakeEnvironment():
         t = self.f.render(txt, True, (255, 255, 255))
         self.screen.blit(t, (630, 50))
 
-        # Border - Left bar
-        bord = pygame.Surface((10, self.height))
-        bord.fill((255, 255, 255))
-        self.screen.blit(bord, (0, 0))
+        # Borders are part of the rasterized board
+        if not self.raster:
+            # Border - Left bar
+            bord = pygame.Surface((10, self.height))
+            bord.fill((255, 255, 255))
+            self.screen.blit(bord, (0, 0))
 
-        # Border -  Right bar
-        bord = pygame.Surface((10, self.height))
-        bord.fill((255, 255, 255))
-        self.screen.blit(bord, (self.width-10, 0))
+            # Border -  Right bar
+            bord = pygame.Surface((10, self.height))
+            bord.fill((255, 255, 255))
+            self.screen.blit(bord, (self.width-10, 0))
 
-        # Border -  Up bar
-        bord = pygame.Surface((self.width, 10))
-        bord.fill((255, 255, 255))
-        self.screen.blit(bord, (0, 0))
+            # Border -  Up bar
+            bord = pygame.Surface((self.width, 10))
+            bord.fill((255, 255, 255))
+            self.screen.blit(bord, (0, 0))
 
-        # Border -  Down bar
-        bord = pygame.Surface((self.width, 10))
-        bord.fill((255, 255, 255))
-        self.screen.blit(bord, (0, self.height-10))
+            # Border -  Down bar
+            bord = pygame.Surface((self.width, 10))
+            bord.fill((255, 255, 255))
+            self.screen.blit(bord, (0, self.height-10))
 
         # Plot metrics
         if self.train:
@@ -170,7 +237,7 @@ class SnakeEnvironment():
                 pygame.draw.circle(
                     self.screen, (255, 255, 255), (820, 100+40*i), 14)
 
-            for i in range(4):
+            for i in range(self.agent.n_actions):
                 if i == self.action:
                     y = 0
                 else:
@@ -182,7 +249,7 @@ class SnakeEnvironment():
                 for j in range(12):
                     pygame.draw.line(self.screen, (255, 255, 255),
                                      (670+15, 120+40*i), (820-15, 100+40*j), 1)
-                    for k in range(4):
+                    for k in range(self.agent.n_actions):
                         pygame.draw.line(
                             self.screen, (255, 255, 255),
                             (820+15, 100+40*j), (970-15, 260+40*k), 1
@@ -190,6 +257,97 @@ class SnakeEnvironment():
 
         pygame.display.update()
 
+    def frame(self):
+        """Rasterize the board (borders, snake and food) into a NumPy pixel
+        array, indexed as [x, y] like pygame.surfarray. The snake blocks on
+        the 20 px grid are marked in a grid of cells with a single write and
+        only the cells changed since the previous frame are repainted from
+        two precomputed tiles (block and background), so the cost does not
+        grow with the snake length. Only the few blocks off the grid (the
+        initial tail) are pasted one by one. It does not need a display, so
+        it can be used to capture frames of headless games.
+
+        Returns:
+            np.array: (width, height, 3) uint8 pixel array of the board. The
+                      array is reused by the next call
+        """
+        if self._frame is None:
+            self._init_raster()
+        cells, new = self._cells, self._new_cells
+
+        # Snake blocks on the grid, in a single fancy-index write
+        xs = np.asarray(self.snake.x[:self.snake.len])
+        ys = np.asarray(self.snake.y[:self.snake.len])
+        on_grid = (xs % 20 == 0) & (ys % 20 == 0) & (xs >= 0) & (ys >= 0) \
+            & (xs < self.width) & (ys < self.height)
+        new[:] = False
+        new[xs[on_grid]//20, ys[on_grid]//20] = True
+
+        # Repaint the changed cells and those covered by the last patches
+        changed = self._dirty
+        changed |= new != cells
+        cx, cy = np.nonzero(changed)
+        self._grid[cx, :, cy, :] = self._tiles[new[cx, cy].view(np.uint8)]
+        changed[:] = False
+        self._cells, self._new_cells = new, cells
+
+        # Off-grid blocks follow the grid ones in the snake, so pasting them
+        # afterwards overlaps them as blit() does
+        for x, y in zip(xs[~on_grid], ys[~on_grid]):
+            self._paste(int(x), int(y), self._block)
+
+        # Food
+        self._paste(*self.food.pos, self._food)
+
+        # Borders
+        frame = self._frame
+        frame[:10] = 255
+        frame[self.width-10:] = 255
+        frame[:, :10] = 255
+        frame[:, self.height-10:] = 255
+
+        return frame
+
+    def _init_raster(self):
+        """Allocate the frame, a view of a canvas padded to whole cells, and
+        the cells grids, and precompute the tiles used by frame().
+
+        """
+        n_cols, n_rows = -(-self.width//20), -(-self.height//20)
+        canvas = np.empty((n_cols*20, n_rows*20, 3), dtype=np.uint8)
+        canvas[:] = (22, 29, 31)
+        self._frame = canvas[:self.width, :self.height]
+        # [col, x in cell, row, y in cell] view of the canvas
+        self._grid = canvas.reshape(n_cols, 20, n_rows, 20, 3)
+        self._cells = np.zeros((n_cols, n_rows), dtype=bool)
+        self._new_cells = np.zeros_like(self._cells)
+        self._dirty = np.zeros_like(self._cells)
+
+        # Snake block with its black left and top edges
+        self._block = np.full((20, 20, 3), 255, dtype=np.uint8)
+        self._block[0, :] = 0
+        self._block[:, 0] = 0
+        # Background and block tiles, indexed by the cell occupancy
+        self._tiles = np.empty((2, 20, 20, 3), dtype=np.uint8)
+        self._tiles[0] = (22, 29, 31)
+        self._tiles[1] = self._block
+
+        self._food = np.empty((20, 20, 3), dtype=np.uint8)
+        self._food[:] = (163, 51, 51)
+
+    def _paste(self, x: int, y: int, patch: np.array):
+        """Paste a patch at the (x, y) position of the frame, clipping the
+        pixels out of the board. The cells it covers are repainted by the
+        next frame.
+
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x+patch.shape[0], self.width)
+        y1 = min(y+patch.shape[1], self.height)
+        if x0 < x1 and y0 < y1:
+            self._frame[x0:x1, y0:y1] = patch[x0-x:x1-x, y0-y:y1-y]
+            self._dirty[x0//20:(x1-1)//20+1, y0//20:(y1-1)//20+1] = True
+
     def step(self, act: int, state: np.array):
         """At each game step evaluate the game status (if the snake eats itself
         or collides with the borders). Then perform the snake move and get the 
@@ -204,7 +362,11 @@ class SnakeEnvironment():
         self.reward = 0
         self.snake.ate = False
         self.snake.crashed = False
-        self.clock.tick(1000)
+        if self.clock is not None:
+            self.clock.tick(self.fps)
+
+        # Relative actions are turns wrt the current direction
+        act = self.agent.absolute_action(act, self.snake.dir)
 
         # Manage actions
         if act == 2 and self.snake.dir != 0:
@@ -235,7 +397,10 @@ class SnakeEnvironment():
 
         # If die end the game
         if died:
-            self.stop = True
+            self.died = True
+            self.terminate('died')
+        elif not self.stop:
+            self.check_budgets(ate)
 
         if self.display:
             try:
@@ -252,8 +417,8 @@ class SnakeEnvironment():
         """
         # Get state 1
         state1 = self.agent.get_state(self.snake, self.food)
-        # Choose default actin
-        action = 0
+        # Choose default action, keeping the initial direction
+        action = self.agent.default_action
         # Perform action
         self.step(action, state1)
         self.step_ctr += 1
@@ -264,11 +429,12 @@ class SnakeEnvironment():
         experience = (state1, action, self.reward, state2)
         if self.train:
             # Update agent's memory
-            self.agent.memory.push(experience)
+            self.remember(experience)
             # Train the network and get the metrics
-            history = self.agent.memory.replay(self.stop)
+            history = self.agent.memory.replay(self.died)
             self.stat.loss.append(history['loss'][0])
             self.stat.accuracy.append(history['accuracy'][0]*100)
+        self.report()
 
         while not self.stop:
             self.step_ctr += 1
@@ -284,7 +450,7 @@ class SnakeEnvironment():
             if random.random() < self.eps:
                 # Explore
                 self.explore_ctr += 1  # For stats
-                action = random.randint(0, 3)
+                action = self.agent.random_action(state1)
             else:
                 # Exploit
                 self.exploit_ctr += 1  # For stats
@@ -298,10 +464,94 @@ class SnakeEnvironment():
             # Manage memory
             experience = (state1, action, self.reward, state2)
             if self.train:
-                self.agent.memory.push(experience)
-                history = self.agent.memory.replay(self.stop)
+                self.remember(experience)
+                history = self.agent.memory.replay(self.died)
                 self.stat.loss.append(history['loss'][0])
                 self.stat.accuracy.append(history['accuracy'][0]*100)
+            self.report()
+
+    def remember(self, experience: tuple):
+        """Store an experience in the agent's memory. In n-step mode the
+        experience is folded into the n-step window, which is flushed when
+        the game stops. Only the death is a terminal state, the episodes
+        ended by a budget are bootstrapped.
+
+        Arguments:
+            experience (tuple): (state, action, reward, next state)
+
+        """
+        if self.n_step is None:
+            self.agent.memory.push(experience)
+            return
+        transitions = self.n_step.push(experience, self.died)
+        if self.stop and not self.died:
+            # Truncated episode: the last states are bootstrapped
+            transitions += self.n_step.flush(False)
+        for transition in transitions:
+            self.agent.memory.push(transition)
+
+    def report(self):
+        """Update the live metrics after a step. Only numbers are stored, the
+        metrics are formatted by the telemetry server when scraped.
+
+        """
+        if self.telemetry is None:
+            return
+        tel = self.telemetry
+        tel.inc('snake_steps_total')
+        if self.train:
+            tel.inc('snake_replay_updates_total')
+            tel.set('snake_loss', self.stat.loss[-1])
+            tel.set('snake_accuracy', self.stat.accuracy[-1])
+        tel.set('snake_memory_size', len(self.agent.memory))
+        tel.set('snake_memory_push_count', self.agent.memory.push_count)
+        tel.set('snake_epsilon', self.eps)
+        tel.set('snake_episode', self.episode)
+        tel.set('snake_score', self.score)
+        tel.set('snake_survival', self.step_ctr)
+        if self.stop:
+            tel.inc('snake_episodes_total')
+            tel.inc('snake_terminations_total',
+                    labels={'reason': self.termination})
+
+    def check_budgets(self, ate: bool):
+        """Stop the episodes which would never end: too many steps, too many
+        steps without eating, or a (head, direction, body) state repeating
+        before eating, which for a greedy policy means an endless loop.
+
+        Arguments:
+            ate (bool): true if the snake ate the food in this step
+
+        """
+        if ate:
+            self.food_ctr = 0
+            self.seen.clear()
+        else:
+            self.food_ctr += 1
+
+        if self.max_steps is not None and self.step_ctr >= self.max_steps:
+            self.terminate('max_steps')
+        elif self.starvation_limit is not None \
+                and self.food_ctr >= self.starvation_limit:
+            self.terminate('starvation')
+        elif self.detect_loops:
+            key = hash((self.snake.dir, tuple(self.snake.x),
+                        tuple(self.snake.y)))
+            if key in self.seen:
+                self.terminate('loop')
+            self.seen.add(key)
+
+    def terminate(self, reason: str):
+        """Stop the game and record the termination reason in the
+        statistics.
+
+        Arguments:
+            reason (str): 'died', 'max_steps', 'starvation' or 'loop'
+
+        """
+        self.stop = True
+        self.termination = reason
+        self.stat.terminations[reason] += 1
 
     def self_eat(self):
         """Check if the snake eats itself and return the bool status.
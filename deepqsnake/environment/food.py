@@ -1,4 +1,3 @@
-import pygame
 import random
 
 class Food():
@@ -12,7 +11,8 @@ class Food():
         screen_width (int): the width of the game screen
         screen_height (int): the height of the game screen
         pos (tuple): x and y coordinates of the food
-        img (pygame.Surface): food object to be rendered
+        img (pygame.Surface): food object to be rendered, created on first
+                              access
 
     Methods:
         gen_pos(): Generate the random position of the food in a fixed grid.
@@ -25,10 +25,18 @@ class Food():
 
         # Random apple position
         self.pos = self.gen_pos()
-        
-        # Draw apple
-        self.img = pygame.Surface((20, 20))
-        self.img.fill((163, 51, 51))
+        self._img = None
+
+    @property
+    def img(self):
+        if self._img is None:
+            import pygame
+
+            # Draw apple
+            self._img = pygame.Surface((20, 20))
+            self._img.fill((163, 51, 51))
+
+        return self._img
 
     def gen_pos(self):
         """Generate the random position of the food in a predetermined grid.
@@ -1,5 +1,3 @@
-import pygame
-
 class Snake():
     """Generate the snake object and design the movements.
 
@@ -9,7 +7,8 @@ class Snake():
         dir (int): direction taken by the snake
         ate (bool): true if the snake ate the food
         crashed (bool): true if the snake crashed with the borders
-        img (pygame.Surface): snake blocks to be rendered
+        img (pygame.Surface): snake blocks to be rendered, created on first
+                              access
         bord1 (pygame.Surface): snake blocks to be rendered
         bord2 (pygame.Surface): snake blocks to be rendered
         len (int): length of the snake
@@ -27,19 +26,43 @@ class Snake():
 
         self.ate = False
         self.crashed = False
-
-        # Draw snake
-        # pylint: disable=too-many-function-args
-        self.img = pygame.Surface((20, 20))
-        self.img.fill((255, 255, 255))
-        self.bord1 = pygame.Surface((1, 20))
-        self.bord1.fill((0, 0, 0))
-        self.bord2 = pygame.Surface((20, 1))
-        self.bord2.fill((0, 0, 0))
+        self._surfaces = None
 
         # Snake length
         self.len = len(self.x)
 
+    def _draw(self):
+        """Create the surfaces of the snake blocks. pygame is only needed to
+        render the game, so it is imported here.
+
+        """
+        if self._surfaces is None:
+            import pygame
+
+            # Draw snake
+            # pylint: disable=too-many-function-args
+            img = pygame.Surface((20, 20))
+            img.fill((255, 255, 255))
+            bord1 = pygame.Surface((1, 20))
+            bord1.fill((0, 0, 0))
+            bord2 = pygame.Surface((20, 1))
+            bord2.fill((0, 0, 0))
+            self._surfaces = (img, bord1, bord2)
+
+        return self._surfaces
+
+    @property
+    def img(self):
+        return self._draw()[0]
+
+    @property
+    def bord1(self):
+        return self._draw()[1]
+
+    @property
+    def bord2(self):
+        return self._draw()[2]
+
     def move(self):
         """Update the snake position according to the movement and direction.
 
@@ -1 +1,15 @@
-from .stats import Statistics
\ No newline at end of file
+import importlib
+
+_LAZY = {
+    'Statistics': '.stats',
+    'Telemetry': '.telemetry',
+    'TelemetryServer': '.telemetry',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,8 +1,4 @@
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.backends.backend_agg as agg
-import pylab
-from collections import deque
+from collections import deque, Counter
 
 class Statistics():
     """
@@ -10,18 +6,40 @@ class Statistics():
     pass them to the pygame display to be rendered.
 
     Attributes:
-        fig (pylab.figure): define the figure
+        fig (pylab.figure): define the figure, created by the first plot
         ax (pyab.figure.gca): plot axes
+        canvas (FigureCanvasAgg): canvas rendering the figure
         loss (dequeue): collection of the loss values
         accuracy (dequeue): collection of the accuracy values
+        terminations (Counter): number of episodes ended by each reason
 
     """
     def __init__(self):
+        self.fig = None
+        self.ax = None
+        self.canvas = None
+        self.loss = deque([])
+        self.accuracy = deque([])
+        self.terminations = Counter()
+
+    def initFigure(self):
+        """
+        Create the figure the first time a plot is requested. matplotlib is
+        imported here, so collecting the metrics without plotting them does
+        not load the plotting backend.
+
+        """
+        if self.fig is not None:
+            return
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.backends.backend_agg as agg
+        import pylab
+
         self.fig = pylab.figure(figsize=[4,2.5])
         self.fig.set_facecolor('#161d1f')
         self.ax = self.fig.gca()
-        self.loss = deque([])
-        self.accuracy = deque([])
+        self.canvas = agg.FigureCanvasAgg(self.fig)
 
     def rotateQueue(self):
         """
@@ -40,6 +58,7 @@ class Statistics():
         to the pygame display
 
         """
+        self.initFigure()
         self.rotateQueue()
         self.ax.clear()
         
@@ -57,7 +76,7 @@ class Statistics():
         
         self.ax.plot(self.loss, color = 'white')
 
-        canvas = agg.FigureCanvasAgg(self.fig)
+        canvas = self.canvas
         canvas.draw()
         renderer = canvas.get_renderer()
         size = canvas.get_width_height()
@@ -71,6 +90,7 @@ class Statistics():
         them to the pygame display
 
         """
+        self.initFigure()
         self.rotateQueue()
         self.ax.clear()
         
@@ -88,7 +108,7 @@ class Statistics():
         
         self.ax.plot(self.accuracy, color = 'white')
 
-        canvas = agg.FigureCanvasAgg(self.fig)
+        canvas = self.canvas
         canvas.draw()
         renderer = canvas.get_renderer()
         size = canvas.get_width_height()
@@ -0,0 +1,220 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Telemetry():
+    """Thread-safe registry of the training counters and gauges. The
+    simulation thread only updates numbers under a short lock. A sampler
+    thread updates, every interval seconds, an exponentially weighted rate
+    of each counter named <name>_total, so the exposition is the same for
+    every scraper and for every scrape.
+
+    Parameters:
+        interval (float): seconds between two rate samples
+        half_life (float): half life in seconds of the weighted rates
+
+    Attributes:
+        counters (dict): monotonically increasing values, by (name, labels)
+        gauges (dict): current values, by (name, labels)
+        rates (dict): per second rates of the *_total counters
+
+    Methods:
+        inc(name, value, labels): Increase a counter
+        set(name, value, labels): Set a gauge
+        sample(): Update the rates of the counters
+        start(): Start the sampler thread
+        stop(): Stop the sampler thread
+        render(): Format the metrics in the plain-text exposition format
+    """
+
+    def __init__(self, interval:float=1., half_life:float=10.):
+        self.interval = interval
+        self.half_life = half_life
+        self.counters = {}
+        self.gauges = {}
+        self.rates = {}
+        self._lock = threading.Lock()
+        self._last = {}
+        self._last_time = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _key(name:str, labels:dict):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def inc(self, name:str, value:float=1, labels:dict=None):
+        """Increase a counter.
+
+        Parameters:
+            name (str): name of the counter
+            value (float): increment
+            labels (dict): optional labels of the series
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name:str, value:float, labels:dict=None):
+        """Set a gauge.
+
+        Parameters:
+            name (str): name of the gauge
+            value (float): current value
+            labels (dict): optional labels of the series
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def sample(self):
+        """Update the exponentially weighted per second rate of each counter
+        named <name>_total with its increase since the previous sample.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            last_time, self._last_time = self._last_time, now
+            for key, value in self.counters.items():
+                if not key[0].endswith('_total'):
+                    continue
+                last = self._last.get(key, 0)
+                self._last[key] = value
+                if last_time is None or now <= last_time:
+                    self.rates.setdefault(key, 0.)
+                    continue
+                rate = (value-last)/(now-last_time)
+                if key not in self.rates:
+                    self.rates[key] = rate
+                    continue
+                alpha = 1 - 0.5**((now-last_time)/self.half_life)
+                self.rates[key] += alpha*(rate-self.rates[key])
+
+    def start(self):
+        """Start the sampler thread.
+
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.sample()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.sample()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sampler thread.
+
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def _series(name:str, labels:tuple):
+        if not labels:
+            return name
+        body = ','.join(f'{k}="{v}"' for k, v in labels)
+
+        return f'{name}{{{body}}}'
+
+    def render(self):
+        """Format the metrics in the plain-text exposition format. For each
+        counter named <name>_total a <name>_per_second gauge reports its
+        weighted rate. Rendering does not change the registry.
+
+        Returns:
+            str: the metrics, one per line
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            rates = dict(self.rates)
+
+        lines = []
+        def emit(kind, series):
+            typed = set()
+            for (name, labels), value in sorted(series.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} {kind}')
+                    typed.add(name)
+                lines.append(f'{self._series(name, labels)} {value}')
+        emit('counter', counters)
+        # Counters not sampled yet have a null rate
+        emit('gauge', {(name[:-len('_total')]+'_per_second', labels):
+                       round(rates.get((name, labels), 0.), 3)
+                       for name, labels in counters
+                       if name.endswith('_total')})
+        emit('gauge', gauges)
+
+        return '\n'.join(lines)+'\n'
+
+
+class TelemetryServer():
+    """Background HTTP server exposing the metrics of a Telemetry registry at
+    /metrics. The server runs in a daemon thread, so it never blocks the
+    simulation.
+
+    Parameters:
+        telemetry (Telemetry): the metrics registry
+        host (str): address to bind
+        port (int): port to bind, 0 for a free one
+
+    Attributes:
+        telemetry (Telemetry): the metrics registry
+        address (tuple): bound (host, port)
+
+    Methods:
+        start(): Start serving in a background thread
+        stop(): Stop the server
+    """
+
+    def __init__(self, telemetry:Telemetry, host:str='127.0.0.1',
+                 port:int=8000):
+        self.telemetry = telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path not in ('/', '/metrics'):
+                    handler.send_error(404)
+                    return
+                body = telemetry.render().encode()
+                handler.send_response(200)
+                handler.send_header(
+                    'Content-Type', 'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        """Start serving in a background thread, and the rate sampler of
+        the registry.
+
+        """
+        self.telemetry.start()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server.
+
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.telemetry.stop()
@@ -0,0 +1,16 @@
+import importlib
+
+_LAZY = {
+    'grid_space': '.sweep',
+    'random_space': '.sweep',
+    'run_sweep': '.sweep',
+    'format_table': '.sweep',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
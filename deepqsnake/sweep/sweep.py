@@ -0,0 +1,340 @@
+import os
+import csv
+import json
+import time
+import random
+import hashlib
+import itertools
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+# Columns of the results table
+COLUMNS = ['job', 'status', 'episodes', 'final_score', 'best_score',
+           'steps_to_threshold', 'steps', 'steps_per_sec', 'terminations',
+           'params', 'error']
+
+
+def grid_space(space:dict):
+    """Expand a grid search space into the list of its configurations.
+
+    Parameters:
+        space (dict): parameter name -> list of values
+
+    Returns:
+        list: one dict of parameters per configuration
+    """
+    names = sorted(space)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[space[n] for n in names])]
+
+
+def random_space(space:dict, n_jobs:int, seed:int=0):
+    """Draw the configurations of a random search. Each parameter is either
+    a list of values (uniform choice), a (low, high) tuple (uniform value) or
+    a ('log', low, high) tuple (log-uniform value).
+
+    Parameters:
+        space (dict): parameter name -> values or range
+        n_jobs (int): number of configurations to draw
+        seed (int): seed of the random generator
+
+    Returns:
+        list: one dict of parameters per configuration
+    """
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(n_jobs):
+        params = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, list):
+                params[name] = rng.choice(values)
+            elif values[0] == 'log':
+                low, high = values[1], values[2]
+                params[name] = low*(high/low)**rng.random()
+            else:
+                params[name] = rng.uniform(values[0], values[1])
+        jobs.append(params)
+
+    return jobs
+
+
+def job_id(params:dict):
+    """Stable identifier of a configuration, used to resume a sweep.
+
+    Parameters:
+        params (dict): parameters of the job
+
+    Returns:
+        str: the job identifier
+    """
+    key = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+def limit_threads(threads:int):
+    """Cap the CPU threads used by a worker process. It must run before
+    TensorFlow is imported, so it is used as the process pool initializer.
+
+    Parameters:
+        threads (int): number of threads per job
+    """
+    for var in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                'TF_NUM_INTRAOP_THREADS']:
+        os.environ[var] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    # Headless games
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+
+def run_job(params:dict, config:dict):
+    """Train a headless agent with the given parameters. The training stops
+    after config['episodes'] episodes, as soon as the rolling mean score over
+    config['window'] episodes reaches config['target'], or when the rolling
+    mean did not improve for config['patience'] episodes. The optional
+    config['max_steps'], config['max_steps_since_food'] and
+    config['detect_loops'] end the endless episodes, and the episodes ended
+    by each reason are counted in the results.
+
+    Parameters:
+        params (dict): Agent parameters of the job
+        config (dict): screen size, episodes, window, target, patience,
+                       threads and episode budgets of the sweep
+
+    Returns:
+        dict: the results of the job
+    """
+    from ..agent.agent import Agent
+    from ..stats.stats import Statistics
+    from ..environment.environment import SnakeEnvironment
+
+    # The numpy backend never loads TensorFlow
+    if params.get('backend', 'keras') == 'keras':
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(
+            config['threads'])
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    agent = Agent(
+        screen_width=config['screen_width'],
+        screen_height=config['screen_height'],
+        **params
+    )
+
+    scores = deque(maxlen=config['window'])
+    terminations = Counter()
+    best, waited = float('-inf'), 0
+    steps, steps_to_threshold = 0, None
+    status = 'done'
+    start = time.perf_counter()
+    episode = 0
+    while episode < config['episodes']:
+        env = SnakeEnvironment(
+            screen_width=config['screen_width'],
+            screen_height=config['screen_height'],
+            stat=Statistics(),
+            episode=episode,
+            agent=agent,
+            train=True,
+            display=False,
+            max_steps=config.get('max_steps'),
+            max_steps_since_food=config.get('max_steps_since_food'),
+            detect_loops=config.get('detect_loops', False),
+            fps=None
+        )
+        env.run()
+        steps += env.step_ctr
+        terminations[env.termination] += 1
+        scores.append(env.score)
+        del env
+        episode += 1
+
+        # Early stopping on the rolling score
+        rolling = sum(scores)/len(scores)
+        if len(scores) < scores.maxlen:
+            continue
+        if config['target'] is not None and rolling >= config['target']:
+            steps_to_threshold = steps
+            status = 'target'
+            break
+        if rolling > best:
+            best, waited = rolling, 0
+        else:
+            waited += 1
+        if config['patience'] is not None and waited >= config['patience']:
+            status = 'patience'
+            break
+    agent.memory.stop_prefetch()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'job': job_id(params),
+        'status': status,
+        'episodes': episode,
+        'final_score': sum(scores)/max(len(scores), 1),
+        'best_score': max(best, sum(scores)/max(len(scores), 1)),
+        'steps_to_threshold': steps_to_threshold,
+        'steps': steps,
+        'steps_per_sec': steps/elapsed,
+        'terminations': dict(terminations),
+        'params': params,
+    }
+
+
+def failed_job(params:dict, error:BaseException):
+    """Result of a job that raised an exception.
+
+    Parameters:
+        params (dict): Agent parameters of the job
+        error (BaseException): the exception raised by the job
+
+    Returns:
+        dict: the results of the job, with status 'error'
+    """
+    return {
+        'job': job_id(params),
+        'status': 'error',
+        'episodes': 0,
+        'final_score': None,
+        'best_score': None,
+        'steps_to_threshold': None,
+        'steps': 0,
+        'steps_per_sec': None,
+        'terminations': {},
+        'params': params,
+        'error': f'{type(error).__name__}: {error}',
+    }
+
+
+def load_results(path:str):
+    """Load the results of the jobs already completed.
+
+    Parameters:
+        path (str): path of the .jsonl results file
+
+    Returns:
+        list: the results, one dict per job
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_sweep(jobs:list, config:dict, results_path:str, workers:int=None):
+    """Run the training jobs in parallel over a process pool. Each result is
+    appended to the results file as soon as its job ends, and the jobs found
+    in the file are skipped, so an interrupted sweep can be resumed. A job
+    raising an exception is reported with status 'error' and its message,
+    but it is not written to the file, so it is retried on resume.
+
+    Parameters:
+        jobs (list): one dict of Agent parameters per job
+        config (dict): screen size, episodes, window, target, patience and
+                       threads of the sweep
+        results_path (str): path of the .jsonl results file
+        workers (int): number of parallel jobs. Defaults to the number of
+                       cores divided by the threads per job
+
+    Returns:
+        list: the results of all the jobs
+    """
+    results = load_results(results_path)
+    done = {res['job'] for res in results}
+    todo = [params for params in jobs if job_id(params) not in done]
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1)//config['threads'])
+
+    # Spawned workers import TensorFlow after the thread caps are set
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=limit_threads,
+            initargs=(config['threads'],)) as pool:
+        futures = {pool.submit(run_job, params, config): params
+                   for params in todo}
+        for future in as_completed(futures):
+            try:
+                res = future.result()
+            except Exception as e:
+                # A failed job must not stop the sweep nor be skipped on
+                # resume
+                res = failed_job(futures[future], e)
+            else:
+                with open(results_path, 'a') as f:
+                    f.write(json.dumps(res)+'\n')
+            results.append(res)
+            print(format_table([res], header=False))
+
+    return results
+
+
+def _cell(value, width:int, spec:str=''):
+    """Format a right-aligned table cell, with a dash for the missing
+    values.
+
+    """
+    if value is None:
+        return f'{"-":>{width}}'
+
+    return f'{value:>{width}{spec}}'
+
+
+def _ends(terminations:dict):
+    """Format the episodes ended by each reason, e.g. 'died:40 loop:3'.
+
+    """
+    if not terminations:
+        return '-'
+
+    return ' '.join(f'{reason}:{n}' for reason, n in sorted(
+        terminations.items(), key=lambda item: -item[1]))
+
+
+def format_table(results:list, header:bool=True):
+    """Format the results as a plain text table.
+
+    Parameters:
+        results (list): the results, one dict per job
+        header (bool): true to include the header row
+
+    Returns:
+        str: the table
+    """
+    rows = []
+    if header:
+        rows.append(f'{"job":<10} {"status":<8} {"eps":>5} {"score":>7} '
+                    f'{"best":>7} {"to_thr":>8} {"steps/s":>8} '
+                    f'{"ended by":<28}  params')
+    for res in results:
+        to_thr = res['steps_to_threshold']
+        row = (f'{res["job"]:<10} {res["status"]:<8} {res["episodes"]:>5} '
+               f'{_cell(res["final_score"], 7, ".2f")} '
+               f'{_cell(res["best_score"], 7, ".2f")} '
+               f'{_cell(to_thr, 8)} '
+               f'{_cell(res["steps_per_sec"], 8, ".1f")} '
+               f'{_ends(res.get("terminations")):<28}  '
+               f'{json.dumps(res["params"])}')
+        if res.get('error'):
+            row += f'  {res["error"]}'
+        rows.append(row)
+
+    return '\n'.join(rows)
+
+
+def write_csv(results:list, path:str):
+    """Write the results table to a .csv file.
+
+    Parameters:
+        results (list): the results, one dict per job
+        path (str): path of the .csv file
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for res in results:
+            writer.writerow({**res, 'params': json.dumps(res['params']),
+                             'terminations': json.dumps(
+                                 res.get('terminations', {}))})
@@ -0,0 +1,137 @@
+import os
+import time
+import argparse
+import multiprocessing
+
+SCREEN_WIDTH = 320
+SCREEN_HEIGHT = 320
+GAMMA = .9
+
+
+def make_agent(**kwargs):
+    from deepqsnake.agent.agent import Agent
+
+    params = dict(memory_capacity=1E6, memory_batch_size=5E3)
+    params.update(kwargs)
+
+    return Agent(
+        screen_width=SCREEN_WIDTH,
+        screen_height=SCREEN_HEIGHT,
+        eps_decay=.03,
+        gamma=GAMMA,
+        **params
+    )
+
+
+def actor(address, episodes:int, batch_size:int, starvation:float=2,
+          detect_loops:bool=False):
+    """Actor process: play headless games and stream the transitions.
+
+    """
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    from deepqsnake.stats.stats import Statistics
+    from deepqsnake.distributed.actor import run_actor
+
+    # The actions come from a NumpyPolicy: the agent only provides the
+    # states, rewards and epsilon, so it gets no TensorFlow model and no
+    # replay memory to speak of
+    agent = make_agent(backend='numpy', memory_capacity=1,
+                       memory_batch_size=1)
+    stat = Statistics()
+    sent = run_actor(address, agent, episodes, batch_size, GAMMA,
+                     max_steps_since_food=starvation,
+                     detect_loops=detect_loops, stat=stat)
+    ends = ', '.join(f'{reason} {n}'
+                     for reason, n in stat.terminations.most_common())
+    print(f'Actor {os.getpid()}: {sent} transitions sent, games ended by: '
+          f'{ends}')
+
+
+def learner(address, updates:int, publish_every:int, min_fill:int,
+            actors:list=()):
+    """Learner: append the received transitions to the replay memory, train
+    the network and publish the weights. It stops after the given number of
+    updates, or when all the local actors ended.
+
+    """
+    from deepqsnake.distributed.ingest import IngestServer
+
+    agent = make_agent()
+    server = IngestServer(agent.memory, address)
+    server.start()
+    server.publish_weights(agent.memory.model.get_weights())
+    print(f'Learner listening on {server.address}')
+
+    n_updates = 0
+    start = time.perf_counter()
+    while updates is None or n_updates < updates:
+        server.drain()
+        if actors and not any(p.is_alive() for p in actors) \
+                and server.pending.empty():
+            break
+        if len(agent.memory) < min_fill:
+            time.sleep(1E-2)
+            continue
+        # The transitions carry their own done flag and discount
+        agent.memory.replay(False)
+        n_updates += 1
+        if n_updates % publish_every == 0:
+            server.publish_weights(agent.memory.model.get_weights())
+            agent.save_weights('weights/weights.weights.h5')
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    print(f'Received {server.received} transitions, '
+          f'{server.rejected} batches delayed by backpressure, '
+          f'{n_updates} updates ({n_updates/elapsed:.1f}/s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Distributed training: remote actors stream their '
+                    'transitions to a single learner')
+    parser.add_argument('mode', choices=['learner', 'actor', 'local'],
+                        help='run the learner, an actor, or a learner with '
+                             'local actor processes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--unix', default=None,
+                        help='Unix socket path, used instead of TCP')
+    parser.add_argument('--actors', type=int, default=2,
+                        help='local actor processes')
+    parser.add_argument('--episodes', type=int, default=100,
+                        help='games played by each actor')
+    parser.add_argument('--starvation', type=float, default=2,
+                        help='maximum steps without food per game, in '
+                             'board areas')
+    parser.add_argument('--detect-loops', action='store_true',
+                        help='end the games stuck in a loop')
+    parser.add_argument('--batch', type=int, default=256,
+                        help='transitions per pushed batch')
+    parser.add_argument('--updates', type=int, default=None,
+                        help='learner updates, unlimited by default')
+    parser.add_argument('--publish-every', type=int, default=10,
+                        help='updates between two published weights')
+    parser.add_argument('--min-fill', type=int, default=1000,
+                        help='transitions needed to start training')
+    args = parser.parse_args()
+    address = args.unix or (args.host, args.port)
+
+    if args.mode == 'actor':
+        actor(address, args.episodes, args.batch, args.starvation,
+              args.detect_loops)
+    elif args.mode == 'learner':
+        learner(address, args.updates, args.publish_every, args.min_fill)
+    else:
+        # Learner and actors on localhost
+        ctx = multiprocessing.get_context('spawn')
+        procs = [ctx.Process(target=actor,
+                             args=(address, args.episodes, args.batch,
+                                   args.starvation, args.detect_loops))
+                 for _ in range(args.actors)]
+        for p in procs:
+            p.start()
+        learner(address, args.updates, args.publish_every, args.min_fill,
+                procs)
+        for p in procs:
+            p.join()
@@ -0,0 +1,27 @@
+from deepqsnake.agent.agent import Agent
+from deepqsnake.agent.quantized import QuantizedPolicy, action_agreement
+
+SCREEN_WIDTH = 320
+SCREEN_HEIGHT = 320
+
+# Initialize the agent
+agent = Agent(
+    screen_width=SCREEN_WIDTH,
+    screen_height=SCREEN_HEIGHT,
+    memory_capacity=1E6,
+    memory_batch_size=5E3,
+    eps_decay=.03,
+    gamma=.9
+)
+# Load the pre-trained weights
+agent.load_weights('weights/weights.weights.h5')
+model = agent.memory.model
+full_size = sum(w.nbytes for w in model.get_weights())
+
+# Export the quantized policies and check them against the full precision one
+for mode in QuantizedPolicy.MODES:
+    policy = QuantizedPolicy.from_model(model, mode)
+    policy.save(f'weights/weights.{mode}.npz')
+    agreement = action_agreement(model, policy)
+    print(f'{mode}: {policy.nbytes} bytes ({full_size} float32), '
+          f'action agreement {agreement*100:.2f}%')
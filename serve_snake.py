@@ -0,0 +1,40 @@
+import asyncio
+from deepqsnake.agent.agent import Agent
+from deepqsnake.agent.policy_server import PolicyServer, load_test
+
+SCREEN_WIDTH = 320
+SCREEN_HEIGHT = 320
+MAX_BATCH_SIZE = 256  # Requests merged into a single forward pass
+MAX_LATENCY = 2E-3  # Latency budget of a micro-batch in seconds
+GAMES = [1, 8, 32, 128, 512]  # Concurrent games simulated by the load test
+TICKS = 50  # Actions requested by each game
+
+# Initialize the agent
+agent = Agent(
+    screen_width=SCREEN_WIDTH,
+    screen_height=SCREEN_HEIGHT,
+    memory_capacity=1E6,
+    memory_batch_size=5E3,
+    eps_decay=.03,
+    gamma=.9
+)
+# Load the pre-trained weights
+agent.load_weights('weights/weights.weights.h5')
+
+
+async def main():
+    # Start the policy server
+    server = PolicyServer(agent.memory, MAX_BATCH_SIZE, MAX_LATENCY,
+                          agent.state_size)
+    await server.start()
+
+    # Report latency against throughput for increasing load
+    print(f'{"games":>6} {"req/s":>10} {"p50 ms":>8} {"p99 ms":>8} {"batch":>7}')
+    for n_games in GAMES:
+        res = await load_test(server, n_games, TICKS)
+        print(f'{res["games"]:>6} {res["throughput"]:>10.1f} '
+              f'{res["p50"]:>8.2f} {res["p99"]:>8.2f} {res["avg_batch"]:>7.1f}')
+
+    await server.stop()
+
+asyncio.run(main())
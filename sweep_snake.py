@@ -0,0 +1,87 @@
+import json
+import argparse
+from deepqsnake.sweep.sweep import (
+    grid_space, random_space, run_sweep, format_table, write_csv)
+
+SCREEN_WIDTH = 320
+SCREEN_HEIGHT = 320
+
+# Default search space
+SPACE = {
+    'memory_capacity': [1E5, 1E6],
+    'memory_batch_size': [1E3, 5E3],
+    'eps_decay': [.01, .03],
+    'gamma': [.9, .95],
+    'learning_rate': [1E-3, 1E-4],
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Parallel hyperparameter sweep of headless training jobs')
+    parser.add_argument('--space', help='JSON file with the search space')
+    parser.add_argument('--random', type=int, default=0, metavar='N',
+                        help='draw N random configurations instead of the grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--episodes', type=int, default=200,
+                        help='maximum training episodes per job')
+    parser.add_argument('--window', type=int, default=20,
+                        help='episodes of the rolling score')
+    parser.add_argument('--target', type=float, default=None,
+                        help='rolling score stopping a job (threshold)')
+    parser.add_argument('--patience', type=int, default=None,
+                        help='episodes without rolling score improvement '
+                             'stopping a job')
+    parser.add_argument('--max-steps', type=int, default=None,
+                        help='maximum steps per episode')
+    parser.add_argument('--starvation', type=float, default=2,
+                        help='maximum steps without food per episode, in '
+                             'board areas')
+    parser.add_argument('--detect-loops', action='store_true',
+                        help='end the episodes stuck in a loop')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parallel jobs (default: cores / threads)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='CPU threads per job')
+    parser.add_argument('--results', default='sweep.jsonl',
+                        help='results file, used to resume the sweep')
+    parser.add_argument('--csv', default=None, help='write the table as CSV')
+    args = parser.parse_args()
+
+    # Build the jobs
+    space = SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+        # JSON has no tuples: the ranges are given as ['range', low, high]
+        # or ['log', low, high]
+        for name, values in space.items():
+            if values and values[0] == 'range':
+                space[name] = tuple(values[1:])
+            elif values and values[0] == 'log':
+                space[name] = tuple(values)
+    if args.random:
+        jobs = random_space(space, args.random, args.seed)
+    else:
+        jobs = grid_space(space)
+
+    config = {
+        'screen_width': SCREEN_WIDTH,
+        'screen_height': SCREEN_HEIGHT,
+        'episodes': args.episodes,
+        'window': args.window,
+        'target': args.target,
+        'patience': args.patience,
+        'threads': args.threads,
+        'max_steps': args.max_steps,
+        'max_steps_since_food': args.starvation,
+        'detect_loops': args.detect_loops,
+    }
+
+    # Run the sweep and print the results table
+    results = run_sweep(jobs, config, args.results, args.workers)
+    # Failed jobs have no score and go last
+    results.sort(key=lambda res: (res['final_score'] is not None,
+                                  res['final_score'] or 0), reverse=True)
+    print(format_table(results))
+    if args.csv:
+        write_csv(results, args.csv)
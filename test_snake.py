@@ -32,9 +32,12 @@ env = SnakeEnvironment(
     episode=0,
     agent=agent,
     train=False,
-    display=True
+    display=True,
+    max_steps_since_food=2,
+    detect_loops=True
 )
 env.run()
+print(f'Score: {env.score}, ended by: {env.termination}')
 
 # Ending
 del env
@@ -1,11 +1,17 @@
 import pygame
-from deepqsnake.agent import Agent
+from collections import Counter
+from deepqsnake.agent import Agent, prefill_memory
 from deepqsnake.stats import Statistics
 from deepqsnake.environment import SnakeEnvironment
+from deepqsnake.stats.telemetry import Telemetry, TelemetryServer
 
 EPISODES = 1000  # Training episodes
 SCREEN_WIDTH = 320
 SCREEN_HEIGHT = 320
+TELEMETRY_PORT = None  # Port of the live metrics endpoint, None to disable
+BACKEND = 'keras'  # 'numpy' to train the DQN without TensorFlow
+PREFILL = 0  # Heuristic transitions stored before training, 0 to disable
+STARVATION = 2  # Steps without food ending an episode, in board areas
 
 # Initialize the agent
 agent = Agent(
@@ -14,10 +20,24 @@ agent = Agent(
     memory_capacity=1E6,
     memory_batch_size=5E3,
     eps_decay=.03,
-    gamma=.9
+    gamma=.9,
+    backend=BACKEND
 )
 
+# Fill the replay memory with the games of a scripted policy
+if PREFILL:
+    info = prefill_memory(agent, PREFILL)
+    print(f"Prefill: {info['transitions']} transitions from {info['games']} "
+          f"games, mean score {info['score']:.1f}")
+
+# Start the live metrics endpoint
+telemetry = None
+if TELEMETRY_PORT is not None:
+    telemetry = Telemetry()
+    TelemetryServer(telemetry, port=TELEMETRY_PORT).start()
+
 # Start the training
+terminations = Counter()  # Episodes ended by each reason
 episode = 0
 while episode <= EPISODES:
     print(f'Episode:{episode}')
@@ -33,9 +53,13 @@ while episode <= EPISODES:
         episode=episode,
         agent=agent,
         train=True,
-        display=True
+        display=True,
+        telemetry=telemetry,
+        max_steps_since_food=STARVATION
     )
     env.run()
+    terminations[env.termination] += 1
+    print(f'Ended by {env.termination}, totals: {dict(terminations)}')
 
     # Save the trained weights
     agent.save_weights('weights/weights.weights.h5')